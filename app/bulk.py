@@ -0,0 +1,95 @@
+"""Batch variants of the onboarding POST endpoints.
+
+Each endpoint checks the whole list with a few set-based reads, inserts the valid
+items with a single INSERT .. RETURNING per table in one transaction, and answers
+with one result per submitted item (in order) instead of failing the whole batch.
+"""
+from collections import Counter
+
+from fastapi import APIRouter, Body, Depends
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import get_db
+from . import models, ranking, schemas, search
+from .querystats import TimedRoute
+
+router = APIRouter(tags=["bulk"], route_class=TimedRoute)
+
+MAX_BATCH_SIZE = 1000
+
+async def _insert_many(db: AsyncSession, model, rows):
+    if not rows:
+        return []
+    if db.bind.dialect.name != "sqlite":
+        # RETURNING order is not guaranteed elsewhere (Postgres batches may come back in any
+        # order); sort_by_parameter_order makes SQLAlchemy match rows to parameters
+        stmt = insert(model).returning(model, sort_by_parameter_order=True)
+        return (await db.scalars(stmt, rows)).all()
+    # SQLite has no sentinel for sort_by_parameter_order and would fall back to one INSERT
+    # per row; its autoincrement ids follow VALUES order, so sorting by id restores it
+    created = (await db.scalars(insert(model).returning(model), rows)).all()
+    return sorted(created, key=lambda obj: obj.id)
+
+def _results(count, errors, created):
+    # errors: {index: (status, detail)}; created: inserted objects for the other indexes, in order
+    created = iter(created)
+    return [
+        {"index": i, "status": errors[i][0], "detail": errors[i][1]} if i in errors
+        else {"index": i, "status": 200, "item": next(created)}
+        for i in range(count)
+    ]
+
+@router.post("/users:batch", response_model=list[schemas.BatchItemOut[schemas.UserOut]])
+async def create_users(items: list[schemas.UserCreate] = Body(..., max_length=MAX_BATCH_SIZE),
+                       db: AsyncSession = Depends(get_db)):
+    users = await _insert_many(db, models.User, [item.model_dump() for item in items])
+    await db.commit()
+    return _results(len(items), {}, users)
+
+@router.post("/technicians:batch", response_model=list[schemas.BatchItemOut[schemas.TechnicianOut]])
+async def create_technicians(items: list[schemas.TechnicianCreate] = Body(..., max_length=MAX_BATCH_SIZE),
+                             db: AsyncSession = Depends(get_db)):
+    T = models.Technician
+    user_ids = {item.user_id for item in items}
+    roles = dict((await db.execute(select(models.User.id, models.User.role)
+                                   .where(models.User.id.in_(user_ids)))).all())
+    taken = set(await db.scalars(select(T.user_id).where(T.user_id.in_(user_ids))))
+
+    # every new technician starts from the same counters, hence the same static score
+    rank_score = ranking.static_score(T())
+    errors, rows = {}, []
+    for i, item in enumerate(items):
+        if item.user_id not in roles:
+            errors[i] = (404, "User not found")
+        elif roles[item.user_id] not in ("technician", "admin"):
+            errors[i] = (400, "User role must be technician/admin to create technician profile")
+        elif item.user_id in taken:
+            errors[i] = (409, "Technician profile already exists for this user")
+        else:
+            taken.add(item.user_id)
+            rows.append({**item.model_dump(), "rank_score": rank_score})
+
+    techs = await _insert_many(db, T, rows)
+    # bulk INSERTs skip the mapper events that keep the R*Tree mirror in sync
+    await db.run_sync(models.rtree_bulk_upsert, T, techs)
+    await db.commit()
+    for tech in techs:
+        search.technician_saved(tech)
+    return _results(len(items), errors, techs)
+
+@router.post("/certifications:batch", response_model=list[schemas.BatchItemOut[schemas.CertificationOut]])
+async def create_certifications(items: list[schemas.CertificationBatchItem] = Body(..., max_length=MAX_BATCH_SIZE),
+                                db: AsyncSession = Depends(get_db)):
+    T = models.Technician
+    known = set(await db.scalars(select(T.id).where(T.id.in_({item.technician_id for item in items}))))
+    errors = {i: (404, "Technician not found") for i, item in enumerate(items) if item.technician_id not in known}
+    certs = await _insert_many(db, models.Certification,
+                               [item.model_dump() for i, item in enumerate(items) if i not in errors])
+
+    added = Counter(cert.technician_id for cert in certs)
+    if added:
+        await ranking.bump_many(db, T.cert_count, added)
+        await ranking.refresh_static_scores(db, list(added))
+    await db.commit()
+    return _results(len(items), errors, certs)
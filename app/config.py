@@ -0,0 +1,45 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="APP_", env_file=".env", extra="ignore")
+
+    database_url: str = "sqlite:///./app.db"
+    # PRAGMA set applied to each SQLite connection, see database.SQLITE_PRAGMA_PROFILES
+    sqlite_pragma_profile: str = "performance"
+
+    # technician radius search: "bbox" (SQL bounding-box prefilter), "rtree" (SQLite
+    # R*Tree mirror tables) or "grid" (in-process index, only kept in sync within a
+    # single worker process)
+    geo_backend: str = "bbox"
+
+    # /technicians/search query planner (see app/search.py)
+    search_bbox_radius_km: float = 100.0  # at or above this radius the SQL bbox plan is used
+    search_cache_min_hits: int = 200      # only candidate sets at least this large are cached
+    search_cache_decimals: int = 3        # cache keys round lat/lng to this (~110 m) and radius up to 0.1 km
+    search_cache_size: int = 1024
+    search_cache_ttl_s: float = 30.0
+
+    # location-aware /price-estimate rollups
+    price_cell_deg: float = 0.1         # ~11 km cells
+    price_min_samples: int = 20         # widen to neighbouring cells until this many quotes
+    price_max_radius_km: float = 50.0
+    price_daily_retention_days: int = 400   # older daily buckets are merged into months
+    price_compact_interval_s: float = 3600.0
+
+    # Idempotency-Key replay window and in-memory LRU size (see app/idempotency.py)
+    idempotency_ttl_s: float = 86400.0
+    idempotency_cache_size: int = 10000
+
+    # N+1 detection: log (or raise, e.g. in development) when one request runs the
+    # same statement more than this many times (see app/querystats.py)
+    sql_repeat_threshold: int = 10
+    sql_repeat_raise: bool = False
+
+    # Server-Timing header, per-request SQL accounting and request log (app/querystats.py)
+    request_stats: bool = True
+    # JSON request log lines on "app.requests": errors and slow requests always,
+    # everything else at this sample rate (0 disables)
+    request_log_sample_rate: float = 0.01
+    request_log_slow_ms: float = 1000.0
+
+settings = Settings()
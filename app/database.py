@@ -1,20 +1,80 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
 
-DATABASE_URL = "sqlite:///./app.db"
+from .config import settings
+from . import querystats
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+DATABASE_URL = settings.database_url
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# PRAGMAs applied to every new SQLite connection in the pool
+SQLITE_PRAGMA_PROFILES = {
+    # SQLite defaults: rollback journal, readers block behind every commit
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",        # readers keep going while a writer commits
+        "synchronous": "NORMAL",      # fsync at checkpoints only; safe with WAL
+        "busy_timeout": 5000,         # wait for a lock (ms) instead of failing at once
+        "mmap_size": 268435456,       # 256 MiB memory-mapped reads
+        "cache_size": -65536,         # 64 MiB page cache (negative = KiB)
+        "temp_store": "MEMORY",
+    },
+}
+
+# async drivers for the plain URLs accepted in settings.database_url
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def async_url(url):
+    u = make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.drivername, u.drivername))
+
+def _apply_pragmas_on_connect(sync_engine, pragma_profile):
+    pragmas = SQLITE_PRAGMA_PROFILES[pragma_profile]
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+def create_db_engine(url=DATABASE_URL, pragma_profile=settings.sqlite_pragma_profile):
+    """Blocking engine for scripts and benchmarks; the app itself uses the async engine."""
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+    eng = create_engine(url, connect_args={"check_same_thread": False})
+    _apply_pragmas_on_connect(eng, pragma_profile)
+    return eng
+
+def create_async_db_engine(url=DATABASE_URL, pragma_profile=settings.sqlite_pragma_profile):
+    url = async_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_async_engine(url, pool_pre_ping=True)
+    eng = create_async_engine(url)
+    _apply_pragmas_on_connect(eng.sync_engine, pragma_profile)
+    return eng
+
+engine = create_async_db_engine()
+# per-request statement counts and DB time for the app's engine (see app/querystats.py)
+event.listen(engine.sync_engine, "before_cursor_execute", querystats.before_cursor_execute)
+event.listen(engine.sync_engine, "after_cursor_execute", querystats.after_cursor_execute)
+
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def is_lock_conflict(exc) -> bool:
+    """True for SQLite's SQLITE_BUSY / SQLITE_LOCKED (extended codes included): another
+    connection holds the write lock, or committed after this transaction's snapshot."""
+    code = getattr(getattr(exc, "orig", exc), "sqlite_errorcode", None)
+    return code is not None and code & 0xFF in (5, 6)
 
 class Base(DeclarativeBase):
     pass
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,90 @@
+"""Fast JSON path for list responses.
+
+Instead of hydrating ORM objects and validating each one against the endpoint's
+response_model, opted-in endpoints select only the schema's columns, turn the
+rows into plain dicts and encode them in one call (orjson when installed,
+pydantic-core's serializer otherwise). The declared response_model still drives
+the OpenAPI schema; it just isn't run on the way out.
+"""
+import operator
+from functools import lru_cache
+
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from pydantic import create_model
+from pydantic_core import to_json
+
+from .querystats import serializing
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else to_json(obj)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        with serializing():
+            return content if isinstance(content, bytes) else dumps(content)
+
+
+@lru_cache(maxsize=None)
+def projection(schema, model):
+    """(columns to select, [(field, getter)]) to build schema's output from rows of model.
+
+    Fields that are columns are read straight off the row; fields backed by a model
+    property (e.g. Technician.rating_average) call the property on the row, which then
+    selects every column of the table since the property may read any of them.
+    """
+    table = model.__table__
+    getters = []
+    for name, field in schema.model_fields.items():
+        if name in table.c:
+            getters.append((name, operator.attrgetter(name)))
+        elif isinstance(getattr(model, name, None), property):
+            getters.append((name, getattr(model, name).fget))
+        elif not field.is_required():
+            getters.append((name, lambda row, default=field.get_default(): default))
+        else:
+            raise TypeError(f"{schema.__name__}.{name} has no column or property on {model.__name__}")
+    derived = any(name not in table.c for name in schema.model_fields)
+    columns = list(table.c) if derived else [table.c[name] for name in schema.model_fields]
+    if "id" not in schema.model_fields and not derived:
+        columns.append(table.c.id)  # callers page and key rows by id
+    return columns, getters
+
+
+@lru_cache(maxsize=256)
+def sparse_model(schema, fields: frozenset):
+    """schema cut down to fields, built once per distinct field set."""
+    name = f"{schema.__name__}[{','.join(sorted(fields))}]"
+    return create_model(name, **{n: (f.annotation, f) for n, f in schema.model_fields.items() if n in fields})
+
+
+def fields_param(schema):
+    """Dependency for ?fields=a,b,c: the matching sparse_model of schema, or None when absent."""
+    def dependency(fields: Optional[str] = Query(
+        None, description=f"Comma-separated subset of: {', '.join(schema.model_fields)}"
+    )):
+        names = frozenset(name.strip() for name in (fields or "").split(",") if name.strip())
+        if not names:
+            return None
+        unknown = names - schema.model_fields.keys()
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+        return sparse_model(schema, names)
+    return dependency
+
+
+def to_dicts(schema, model, rows):
+    getters = projection(schema, model)[1]
+    with serializing():
+        return [{name: get(row) for name, get in getters} for row in rows]
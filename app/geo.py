@@ -0,0 +1,256 @@
+import math
+import threading
+from array import array
+from collections import defaultdict
+
+from .utils import bounding_box, haversine_many, k_smallest, lng_ranges, within_radius
+
+CELL_DEG = 0.05  # ~5.5 km per cell side at the equator
+EARTH_RADIUS_KM = 6371.0
+
+
+def cell_of(lat, lng, cell_deg=CELL_DEG):
+    return (math.floor(lat / cell_deg), math.floor(lng / cell_deg))
+
+
+def _covering_spans(lat, lng, radius_km, cell_deg):
+    # (y0, y1, [(x0, x1)]) of the cells overlapping the lat/lng box around the search
+    # circle, one x span per side of the antimeridian
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    y0, y1 = math.floor(min_lat / cell_deg), math.floor(max_lat / cell_deg)
+    return y0, y1, [(math.floor(lo / cell_deg), math.floor(hi / cell_deg)) for lo, hi in lng_ranges(min_lng, max_lng)]
+
+
+def covering_cells(lat, lng, radius_km, cell_deg=CELL_DEG):
+    # every cell overlapping the lat/lng box around the search circle
+    y0, y1, x_spans = _covering_spans(lat, lng, radius_km, cell_deg)
+    for y in range(y0, y1 + 1):
+        for x0, x1 in x_spans:
+            for x in range(x0, x1 + 1):
+                yield (y, x)
+
+
+def covering_cell_count(lat, lng, radius_km, cell_deg=CELL_DEG):
+    y0, y1, x_spans = _covering_spans(lat, lng, radius_km, cell_deg)
+    return (y1 - y0 + 1) * sum(x1 - x0 + 1 for x0, x1 in x_spans)
+
+
+def ring_cells(cy, cx, r, bounds):
+    # cells at Chebyshev distance exactly r from (cy, cx) inside bounds (y0, y1, x0, x1)
+    y0, y1, x0, x1 = bounds
+    xs = range(max(cx - r, x0), min(cx + r, x1) + 1)
+    for y in sorted({cy - r, cy + r}):
+        if y0 <= y <= y1:
+            for x in xs:
+                yield (y, x)
+    ys = range(max(cy - r + 1, y0), min(cy + r - 1, y1) + 1)
+    for x in sorted({cx - r, cx + r}) if r else ():
+        if x0 <= x <= x1:
+            for y in ys:
+                yield (y, x)
+
+
+def ring_min_km(lat, lng, cy, cx, r, cell_deg=CELL_DEG):
+    """Lower bound on the distance from (lat, lng) to any point outside rings 0..r."""
+    lat_lo, lat_hi = (cy - r) * cell_deg, (cy + r + 1) * cell_deg
+    lng_lo, lng_hi = (cx - r) * cell_deg, (cx + r + 1) * cell_deg
+    by_lat = EARTH_RADIUS_KM * math.radians(min(lat - lat_lo, lat_hi - lat))
+    # inside the lat band cos(lat) >= cos of the band edge furthest from the equator
+    cos_min = math.cos(math.radians(min(90.0, max(abs(lat_lo), abs(lat_hi)))))
+    dlng = math.radians(min(lng - lng_lo, lng_hi - lng))
+    by_lng = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_min * math.sin(min(dlng, math.pi) / 2)))
+    return min(by_lat, by_lng)
+
+
+def antimeridian_km(lat, lng):
+    """Distance from (lat, lng) to the antimeridian: a lower bound for anything reached across it."""
+    dlng = math.radians(180.0 - abs(lng))
+    if dlng >= math.pi / 2:
+        return EARTH_RADIUS_KM * math.radians(90.0 - abs(lat))  # its nearest point is a pole
+    return EARTH_RADIUS_KM * math.asin(math.cos(math.radians(lat)) * math.sin(dlng))
+
+
+def rtree_overlaps(rt, service_id, lat, lng, radius_km):
+    # WHERE clauses for an R*Tree mirror (see models.enable_rtree), one tuple per side of
+    # the antimeridian; overlap rather than containment because rtree stores coordinates
+    # as outward-rounded float32
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    return [
+        (rt.c.max_lat >= min_lat, rt.c.min_lat <= max_lat,
+         rt.c.max_lng >= lo, rt.c.min_lng <= hi,
+         rt.c.service_id == service_id)
+        for lo, hi in lng_ranges(min_lng, max_lng)
+    ]
+
+
+class CellBuffer:
+    """Parallel contiguous id/lat/lng arrays for the technicians of one grid cell."""
+    __slots__ = ("ids", "lats", "lngs")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.lats = array("d")
+        self.lngs = array("d")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, tech_id, lat, lng):
+        self.ids.append(tech_id)
+        self.lats.append(lat)
+        self.lngs.append(lng)
+
+    def discard(self, tech_id):
+        # swap-remove keeps the arrays dense
+        i = self.ids.index(tech_id)
+        for arr in (self.ids, self.lats, self.lngs):
+            arr[i] = arr[-1]
+            arr.pop()
+
+    def extend_into(self, ids, lats, lngs):
+        ids.extend(self.ids)
+        lats.extend(self.lats)
+        lngs.extend(self.lngs)
+
+
+class GridIndex:
+    """Uniform lat/lng grid of technician coordinates keyed by (service_id, cell)."""
+
+    def __init__(self, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self.loaded = False
+        self._cells = defaultdict(CellBuffer)  # (service_id, cell) -> CellBuffer
+        self._where = {}                 # tech_id -> (service_id, cell)
+        self._count = defaultdict(int)   # service_id -> technicians indexed
+        self._extent = {}                # service_id -> (y0, y1, x0, x1), grow-only
+        self._occupied = defaultdict(set)  # service_id -> cells holding at least one technician
+        self._pending = None             # tech_id -> (service_id, lat, lng) or None, while loading
+        self._lock = threading.Lock()
+
+    def _put(self, tech_id, service_id, lat, lng):
+        key = (service_id, cell_of(lat, lng, self.cell_deg))
+        self._cells[key].add(tech_id, lat, lng)
+        self._where[tech_id] = key
+        self._count[service_id] += 1
+        self._occupied[service_id].add(key[1])
+        y, x = key[1]
+        y0, y1, x0, x1 = self._extent.get(service_id, (y, y, x, x))
+        self._extent[service_id] = (min(y0, y), max(y1, y), min(x0, x), max(x1, x))
+
+    def _drop(self, tech_id):
+        key = self._where.pop(tech_id, None)
+        if key is None:
+            return
+        self._count[key[0]] -= 1
+        bucket = self._cells.get(key)
+        if bucket is not None:
+            bucket.discard(tech_id)
+            if not bucket:
+                del self._cells[key]
+                self._occupied[key[0]].discard(key[1])
+
+    def begin_load(self):
+        """Start logging writes so a rebuild from a snapshot taken after this keeps them."""
+        with self._lock:
+            self._pending = {}
+
+    def rebuild(self, rows):
+        # rows: iterable of (tech_id, service_id, lat, lng); writes since begin_load() are
+        # replayed on top, as the snapshot may predate them
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+            self._count.clear()
+            self._extent.clear()
+            self._occupied.clear()
+            for tech_id, service_id, lat, lng in rows:
+                self._put(tech_id, service_id, lat, lng)
+            for tech_id, row in (self._pending or {}).items():
+                self._drop(tech_id)
+                if row is not None:
+                    self._put(tech_id, *row)
+            self._pending = None
+            self.loaded = True
+
+    def upsert(self, tech_id, service_id, lat, lng):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[tech_id] = (service_id, lat, lng)
+            self._drop(tech_id)
+            self._put(tech_id, service_id, lat, lng)
+
+    def remove(self, tech_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[tech_id] = None
+            self._drop(tech_id)
+
+    def size(self, service_id):
+        return self._count.get(service_id, 0)
+
+    def candidates(self, service_id, lat, lng, radius_km):
+        """(ids, lats, lngs) copied from the cells covering the circle, a superset of its hits."""
+        ids, lats, lngs = array("q"), array("d"), array("d")
+        with self._lock:
+            for cell in covering_cells(lat, lng, radius_km, self.cell_deg):
+                bucket = self._cells.get((service_id, cell))
+                if bucket:
+                    bucket.extend_into(ids, lats, lngs)
+        return ids, lats, lngs
+
+    def search(self, service_id, lat, lng, radius_km):
+        """Return [(tech_id, distance_km)] for technicians within radius_km."""
+        # one batched distance pass over the copied candidate coordinates
+        return within_radius(lat, lng, *self.candidates(service_id, lat, lng, radius_km), radius_km)
+
+    def _collect(self, service_id, lat, lng, cells, ids, dist):
+        # append the technicians of cells and their distances from (lat, lng)
+        lats, lngs = array("d"), array("d")
+        for cell in cells:
+            bucket = self._cells.get((service_id, cell))
+            if bucket:
+                bucket.extend_into(ids, lats, lngs)
+        if lats:
+            d = haversine_many(lat, lng, lats, lngs)
+            if isinstance(d, list):
+                dist.extend(d)
+            else:
+                dist.frombytes(d.tobytes())
+
+    def nearest(self, service_id, lat, lng, k):
+        """Return the k closest [(tech_id, distance_km)], nearest first, by expanding rings.
+
+        Rings are clipped to the service's extent, and once they would probe more cells
+        than the service occupies, its occupied cells are scanned instead, so the work is
+        bounded by the service's size however far the query is from its technicians.
+        """
+        ids, dist = array("q"), array("d")
+        with self._lock:
+            total = self._count.get(service_id, 0)
+            if not total or k <= 0:
+                return []
+            extent = y0, y1, x0, x1 = self._extent[service_id]
+            occupied = self._occupied[service_id]
+            cy, cx = cell_of(lat, lng, self.cell_deg)
+            # rings closer than the extent's edge are empty
+            first_r = max(0, y0 - cy, cy - y1, x0 - cx, cx - x1)
+            max_r = max(abs(cy - y0), abs(cy - y1), abs(cx - x0), abs(cx - x1))
+            # rings do not wrap, so the stopping bound also stops at the antimeridian
+            seam_km = antimeridian_km(lat, lng)
+            probed = 0
+            for r in range(first_r, max_r + 1):
+                ring = list(ring_cells(cy, cx, r, extent))
+                probed += len(ring)
+                if probed > len(occupied):
+                    ids, dist = array("q"), array("d")
+                    self._collect(service_id, lat, lng, occupied, ids, dist)
+                    break
+                self._collect(service_id, lat, lng, ring, ids, dist)
+                if len(ids) >= total:
+                    break
+                if len(ids) >= k and k_smallest(ids, dist, k)[-1][1] <= min(
+                        ring_min_km(lat, lng, cy, cx, r, self.cell_deg), seam_km):
+                    break
+        return k_smallest(ids, dist, k)
+
+tech_index = GridIndex()
@@ -0,0 +1,137 @@
+"""Idempotency-Key support for POST endpoints.
+
+A POST carrying an Idempotency-Key header runs once; its 2xx response is stored
+(in-memory LRU + idempotency_keys table) and retries with the same key and body
+get that response back without reaching the endpoint.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import engine
+from . import models
+from .utils import TTLCache
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    content_type: str
+    body: bytes
+
+results = TTLCache(settings.idempotency_cache_size, settings.idempotency_ttl_s)
+_in_flight = set()  # keys whose first request is still running in this process
+
+def fingerprint(scope, body: bytes) -> str:
+    h = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope["query_string"], body):
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _cutoff():
+    return datetime.utcnow() - timedelta(seconds=settings.idempotency_ttl_s)
+
+async def _load(key: str):
+    t = models.IdempotencyKey.__table__
+    async with engine.connect() as conn:
+        row = (await conn.execute(
+            select(t.c.fingerprint, t.c.status_code, t.c.content_type, t.c.body)
+            .where(t.c.key == key, t.c.created_at >= _cutoff())
+        )).first()
+    return None if row is None else StoredResponse(*row)
+
+async def _save(key: str, stored: StoredResponse):
+    results.set(key, stored)
+    t = models.IdempotencyKey.__table__
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(delete(t).where(t.c.key == key, t.c.created_at < _cutoff()))
+            await conn.execute(insert(t).values(key=key, created_at=datetime.utcnow(), **stored._asdict()))
+    except IntegrityError:
+        pass  # another worker finished the same key first; its response wins
+
+async def purge_idempotency_keys(db: AsyncSession):
+    """Drop stored responses older than idempotency_ttl_s."""
+    await db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < _cutoff()))
+    await db.commit()
+
+async def _read_body(receive) -> bytes:
+    chunks, more = [], True
+    while more:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    return b"".join(chunks)
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware, so only keyed POSTs pay for buffering the request body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        key = next((v.decode("latin-1") for k, v in scope["headers"] if k == HEADER), None)
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await JSONResponse({"detail": "Invalid Idempotency-Key"}, 400)(scope, receive, send)
+
+        body = await _read_body(receive)
+        fp = fingerprint(scope, body)
+        stored = results.get(key)
+        if stored is None:
+            if key in _in_flight:
+                return await JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is in progress"}, 409
+                )(scope, receive, send)
+            # claimed before the first await, so a concurrent retry in this process gets the 409
+            _in_flight.add(key)
+            try:
+                stored = await _load(key)
+                if stored is None:
+                    return await self._run_and_store(key, fp, body, scope, receive, send)
+                results.set(key, stored)
+            finally:
+                _in_flight.discard(key)
+
+        if stored.fingerprint != fp:
+            return await JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"}, 422
+            )(scope, receive, send)
+        await Response(stored.body, stored.status_code, {REPLAYED_HEADER: "true"},
+                       stored.content_type or None)(scope, receive, send)
+
+    async def _run_and_store(self, key, fp, body, scope, receive, send):
+        sent_body = False
+        async def replay_receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start, chunks = {}, []
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        # only successful writes are remembered; errors stay retryable
+        if 200 <= start.get("status", 500) < 300:
+            content_type = dict(start.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+            await _save(key, StoredResponse(fp, start["status"], content_type, b"".join(chunks)))
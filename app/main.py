@@ -1,17 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-
-from .database import Base, engine, get_db
-from . import models, schemas
-from .utils import haversine_km
-
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Verified Technician REST API")
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+from .config import settings
+from .database import engine, get_db, is_lock_conflict
+from .fastjson import fields_param
+from . import bulk, models, pricing, ranking, ratings, schemas, search
+from .idempotency import IdempotencyMiddleware
+from .migrations import backfill, upgrade_connection
+from .pagination import Page, page_params, paginate
+from .querystats import QueryStatsMiddleware, TimedRoute, default_request_log
+from .streaming import stream_format, stream_rows
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        added = await conn.run_sync(upgrade_connection)
+        if settings.geo_backend == "rtree":
+            await conn.run_sync(models.enable_rtree)
+    await backfill(added)
+    compaction = asyncio.create_task(pricing.compaction_loop())
+    yield
+    compaction.cancel()
+    await engine.dispose()
+
+app = FastAPI(title="Verified Technician REST API", lifespan=lifespan)
+app.router.route_class = TimedRoute  # before any route below is declared
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(QueryStatsMiddleware)  # outermost: counts idempotency lookups too
+default_request_log()
+# included before the /technicians/{tech_id} routes so /technicians/search is not captured by them
+app.include_router(search.router)
+app.include_router(pricing.router)
+app.include_router(bulk.router)
+
+@app.exception_handler(StaleDataError)
+async def stale_data(request: Request, exc: StaleDataError):
+    # a versioned UPDATE matched no row: someone else changed it after we read it
+    return JSONResponse({"detail": "Resource was modified concurrently"}, status_code=409)
 
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "Verified Technician REST API",
         "docs": "/docs",
@@ -20,154 +57,171 @@ def root():
 
 # ---------- Users ----------
 @app.post("/users", response_model=schemas.UserOut)
-def create_user(payload: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(payload: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     u = models.User(name=payload.name, role=payload.role)
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
 @app.get("/users", response_model=list[schemas.UserOut])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+async def list_users(response: Response, page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.User), page, response, schema=schemas.UserOut)
 
 # ---------- Services CRUD ----------
 @app.post("/services", response_model=schemas.ServiceOut)
-def create_service(payload: schemas.ServiceCreate, db: Session = Depends(get_db)):
-    exists = db.query(models.Service).filter(models.Service.name == payload.name).first()
+async def create_service(payload: schemas.ServiceCreate, db: AsyncSession = Depends(get_db)):
+    exists = await db.scalar(select(models.Service).where(models.Service.name == payload.name))
     if exists:
         raise HTTPException(status_code=409, detail="Service name already exists")
     s = models.Service(name=payload.name, description=payload.description)
     db.add(s)
-    db.commit()
-    db.refresh(s)
+    await db.commit()
+    await db.refresh(s)
     return s
 
 @app.get("/services", response_model=list[schemas.ServiceOut])
-def list_services(db: Session = Depends(get_db)):
-    return db.query(models.Service).all()
+async def list_services(response: Response, page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.Service), page, response, schema=schemas.ServiceOut)
 
 @app.get("/services/{service_id}", response_model=schemas.ServiceOut)
-def get_service(service_id: int, db: Session = Depends(get_db)):
-    s = db.get(models.Service, service_id)
+async def get_service(service_id: int, db: AsyncSession = Depends(get_db)):
+    s = await db.get(models.Service, service_id)
     if not s:
         raise HTTPException(404, "Service not found")
     return s
 
 @app.put("/services/{service_id}", response_model=schemas.ServiceOut)
-def update_service(service_id: int, payload: schemas.ServiceCreate, db: Session = Depends(get_db)):
-    s = db.get(models.Service, service_id)
+async def update_service(service_id: int, payload: schemas.ServiceCreate, db: AsyncSession = Depends(get_db)):
+    s = await db.get(models.Service, service_id)
     if not s:
         raise HTTPException(404, "Service not found")
     s.name = payload.name
     s.description = payload.description
-    db.commit()
-    db.refresh(s)
+    await db.commit()
+    await db.refresh(s)
     return s
 
 @app.delete("/services/{service_id}")
-def delete_service(service_id: int, db: Session = Depends(get_db)):
-    s = db.get(models.Service, service_id)
+async def delete_service(service_id: int, db: AsyncSession = Depends(get_db)):
+    s = await db.get(models.Service, service_id)
     if not s:
         raise HTTPException(404, "Service not found")
-    db.delete(s)
-    db.commit()
+    await db.delete(s)
+    await db.commit()
     return {"deleted": True}
 
 # ---------- Technicians CRUD + Search ----------
 @app.post("/technicians", response_model=schemas.TechnicianOut)
-def create_technician(payload: schemas.TechnicianCreate, db: Session = Depends(get_db)):
-    user = db.get(models.User, payload.user_id)
+async def create_technician(payload: schemas.TechnicianCreate, db: AsyncSession = Depends(get_db)):
+    user = await db.get(models.User, payload.user_id)
     if not user:
         raise HTTPException(404, "User not found")
     if user.role not in ("technician", "admin"):
         raise HTTPException(400, "User role must be technician/admin to create technician profile")
 
-    if db.query(models.Technician).filter(models.Technician.user_id == payload.user_id).first():
+    if await db.scalar(select(models.Technician).where(models.Technician.user_id == payload.user_id)):
         raise HTTPException(409, "Technician profile already exists for this user")
 
     tech = models.Technician(**payload.model_dump())
+    tech.rank_score = ranking.static_score(tech)
     db.add(tech)
-    db.commit()
-    db.refresh(tech)
+    await db.commit()
+    await db.refresh(tech)
+    search.technician_saved(tech)
     return tech
 
 @app.get("/technicians", response_model=list[schemas.TechnicianOut])
-def list_technicians(db: Session = Depends(get_db)):
-    return db.query(models.Technician).all()
+async def list_technicians(response: Response, page: Page = Depends(page_params),
+                           fields: Optional[type] = Depends(fields_param(schemas.TechnicianOut)),
+                           db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.Technician), page, response, schema=fields or schemas.TechnicianOut)
 
 @app.get("/technicians/{tech_id}", response_model=schemas.TechnicianOut)
-def get_technician(tech_id: int, db: Session = Depends(get_db)):
-    tech = db.get(models.Technician, tech_id)
+async def get_technician(tech_id: int, db: AsyncSession = Depends(get_db)):
+    tech = await db.get(models.Technician, tech_id)
     if not tech:
         raise HTTPException(404, "Technician not found")
     return tech
 
+@app.get("/technicians/{tech_id}/profile", response_model=schemas.TechnicianProfileOut)
+async def get_technician_profile(tech_id: int, reviews: int = Query(5, ge=0, le=50),
+                                 db: AsyncSession = Depends(get_db)):
+    # three statements whatever the profile size: technician JOIN service, its certifications
+    # (selectin), recent reviews; rating summary and job count are denormalized on the row
+    T = models.Technician
+    tech = await db.scalar(select(T).where(T.id == tech_id).options(
+        joinedload(T.service), selectinload(T.certifications)
+    ))
+    if not tech:
+        raise HTTPException(404, "Technician not found")
+    recent = []
+    if reviews:
+        recent = (await db.scalars(select(models.Review).where(models.Review.technician_id == tech_id)
+                                   .order_by(models.Review.id.desc()).limit(reviews))).all()
+    return {
+        **schemas.TechnicianOut.model_validate(tech).model_dump(),
+        "service_name": tech.service and tech.service.name,
+        "certifications": tech.certifications,
+        "recent_reviews": recent,
+    }
+
 @app.put("/technicians/{tech_id}", response_model=schemas.TechnicianOut)
-def update_technician(tech_id: int, payload: schemas.TechnicianUpdate, db: Session = Depends(get_db)):
-    tech = db.get(models.Technician, tech_id)
+async def update_technician(tech_id: int, payload: schemas.TechnicianUpdate, db: AsyncSession = Depends(get_db)):
+    tech = await db.get(models.Technician, tech_id)
     if not tech:
         raise HTTPException(404, "Technician not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(tech, k, v)
-    db.commit()
-    db.refresh(tech)
+    await db.commit()
+    await db.refresh(tech)
+    search.technician_saved(tech)
     return tech
 
 @app.delete("/technicians/{tech_id}")
-def delete_technician(tech_id: int, db: Session = Depends(get_db)):
-    tech = db.get(models.Technician, tech_id)
+async def delete_technician(tech_id: int, db: AsyncSession = Depends(get_db)):
+    # the delete cascades to certifications; load them up front in one SELECT
+    tech = await db.get(models.Technician, tech_id, options=[selectinload(models.Technician.certifications)])
     if not tech:
         raise HTTPException(404, "Technician not found")
-    db.delete(tech)
-    db.commit()
+    await db.delete(tech)
+    await db.commit()
+    search.technician_deleted(tech_id)
     return {"deleted": True}
 
-@app.get("/technicians/search", response_model=list[schemas.TechnicianOut])
-def search_technicians(
-    service_id: int = Query(...),
-    lat: float = Query(...),
-    lng: float = Query(...),
-    radius_km: float = Query(5, gt=0),
-    db: Session = Depends(get_db)
-):
-    techs = db.query(models.Technician).filter(models.Technician.service_id == service_id).all()
-    result = []
-    for t in techs:
-        d = haversine_km(lat, lng, t.lat, t.lng)
-        if d <= radius_km:
-            result.append(t)
-    return result
-
 # ---------- Certifications ----------
 @app.post("/technicians/{tech_id}/certifications", response_model=schemas.CertificationOut)
-def add_cert(tech_id: int, payload: schemas.CertificationCreate, db: Session = Depends(get_db)):
-    tech = db.get(models.Technician, tech_id)
+async def add_cert(tech_id: int, payload: schemas.CertificationCreate, db: AsyncSession = Depends(get_db)):
+    tech = await db.get(models.Technician, tech_id)
     if not tech:
         raise HTTPException(404, "Technician not found")
     c = models.Certification(technician_id=tech_id, **payload.model_dump())
     db.add(c)
-    db.commit()
-    db.refresh(c)
+    await ranking.bump(db, tech_id, models.Technician.cert_count, 1)
+    await ranking.refresh_static_score(db, tech_id)
+    await db.commit()
+    await db.refresh(c)
     return c
 
 @app.get("/technicians/{tech_id}/certifications", response_model=list[schemas.CertificationOut])
-def list_certs(tech_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Certification).filter(models.Certification.technician_id == tech_id).all()
+async def list_certs(tech_id: int, response: Response, page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.Certification).where(models.Certification.technician_id == tech_id), page, response, schema=schemas.CertificationOut)
 
 @app.delete("/certifications/{cert_id}")
-def delete_cert(cert_id: int, db: Session = Depends(get_db)):
-    c = db.get(models.Certification, cert_id)
+async def delete_cert(cert_id: int, db: AsyncSession = Depends(get_db)):
+    c = await db.get(models.Certification, cert_id)
     if not c:
         raise HTTPException(404, "Certification not found")
-    db.delete(c)
-    db.commit()
+    await db.delete(c)
+    await ranking.bump(db, c.technician_id, models.Technician.cert_count, -1)
+    await ranking.refresh_static_score(db, c.technician_id)
+    await db.commit()
     return {"deleted": True}
 
 # ---------- Service Requests CRUD ----------
 @app.post("/requests", response_model=schemas.RequestOut)
-def create_request(payload: schemas.RequestCreate, db: Session = Depends(get_db)):
-    customer = db.get(models.User, payload.customer_id)
+async def create_request(payload: schemas.RequestCreate, db: AsyncSession = Depends(get_db)):
+    customer = await db.get(models.User, payload.customer_id)
     if not customer:
         raise HTTPException(404, "Customer not found")
     if customer.role != "customer":
@@ -175,51 +229,53 @@ def create_request(payload: schemas.RequestCreate, db: Session = Depends(get_db)
 
     req = models.ServiceRequest(**payload.model_dump())
     db.add(req)
-    db.commit()
-    db.refresh(req)
+    await db.commit()
+    await db.refresh(req)
     return req
 
 @app.get("/requests", response_model=list[schemas.RequestOut])
-def list_requests(db: Session = Depends(get_db)):
-    return db.query(models.ServiceRequest).all()
+async def list_requests(response: Response, page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.ServiceRequest), page, response, schema=schemas.RequestOut)
 
 @app.get("/requests/{req_id}", response_model=schemas.RequestOut)
-def get_request(req_id: int, db: Session = Depends(get_db)):
-    req = db.get(models.ServiceRequest, req_id)
+async def get_request(req_id: int, db: AsyncSession = Depends(get_db)):
+    req = await db.get(models.ServiceRequest, req_id)
     if not req:
         raise HTTPException(404, "Request not found")
     return req
 
 @app.put("/requests/{req_id}", response_model=schemas.RequestOut)
-def update_request(req_id: int, payload: schemas.RequestUpdate, db: Session = Depends(get_db)):
-    req = db.get(models.ServiceRequest, req_id)
+async def update_request(req_id: int, payload: schemas.RequestUpdate, db: AsyncSession = Depends(get_db)):
+    req = await db.get(models.ServiceRequest, req_id)
     if not req:
         raise HTTPException(404, "Request not found")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(req, k, v)
-    db.commit()
-    db.refresh(req)
+    await db.commit()
+    await db.refresh(req)
     return req
 
 @app.delete("/requests/{req_id}")
-def delete_request(req_id: int, db: Session = Depends(get_db)):
-    req = db.get(models.ServiceRequest, req_id)
+async def delete_request(req_id: int, db: AsyncSession = Depends(get_db)):
+    req = await db.get(models.ServiceRequest, req_id)
     if not req:
         raise HTTPException(404, "Request not found")
-    db.delete(req)
-    db.commit()
+    await db.delete(req)
+    await db.flush()
+    await pricing.forget_request(db, req)
+    await db.commit()
     return {"deleted": True}
 
 # ---------- Quotations ----------
 @app.post("/requests/{req_id}/quotations", response_model=schemas.QuotationOut)
-def create_quotation(req_id: int, payload: schemas.QuotationCreate, db: Session = Depends(get_db)):
-    req = db.get(models.ServiceRequest, req_id)
+async def create_quotation(req_id: int, payload: schemas.QuotationCreate, db: AsyncSession = Depends(get_db)):
+    req = await db.get(models.ServiceRequest, req_id)
     if not req:
         raise HTTPException(404, "Request not found")
     if req.status in ("COMPLETED", "CANCELED"):
         raise HTTPException(400, "Cannot quote closed request")
 
-    tech = db.get(models.Technician, payload.technician_id)
+    tech = await db.get(models.Technician, payload.technician_id)
     if not tech:
         raise HTTPException(404, "Technician not found")
     if tech.service_id != req.service_id:
@@ -227,40 +283,62 @@ def create_quotation(req_id: int, payload: schemas.QuotationCreate, db: Session
 
     q = models.Quotation(request_id=req_id, **payload.model_dump())
     db.add(q)
+    await pricing.record_quotation(db, req, q.price)
     # optional: set request status
     req.status = "QUOTED"
-    db.commit()
-    db.refresh(q)
+    await db.commit()
+    await db.refresh(q)
     return q
 
 @app.get("/requests/{req_id}/quotations", response_model=list[schemas.QuotationOut])
-def list_quotations(req_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Quotation).filter(models.Quotation.request_id == req_id).all()
+async def list_quotations(req_id: int, response: Response, page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    return await paginate(db, select(models.Quotation).where(models.Quotation.request_id == req_id), page, response, schema=schemas.QuotationOut)
 
 @app.post("/quotations/{quote_id}/accept", response_model=schemas.JobOut)
-def accept_quotation(quote_id: int, db: Session = Depends(get_db)):
-    q = db.get(models.Quotation, quote_id)
+async def accept_quotation(quote_id: int, db: AsyncSession = Depends(get_db)):
+    q = await db.get(models.Quotation, quote_id)
     if not q:
         raise HTTPException(404, "Quotation not found")
     if q.status != "PENDING":
         raise HTTPException(400, "Quotation is not pending")
 
-    req = db.get(models.ServiceRequest, q.request_id)
+    # FOR UPDATE serializes concurrent accepts on Postgres (SQLite has no row locks and
+    # ignores it); either way the version compare-and-swaps let only one of them through
+    R = models.ServiceRequest
+    req = await db.get(R, q.request_id, with_for_update=True)
     if not req:
         raise HTTPException(404, "Request not found")
+    if req.status == "BOOKED":
+        raise HTTPException(409, "Request is already booked")
 
-    # reject other quotations for same request
-    db.query(models.Quotation).filter(
-        models.Quotation.request_id == req.id,
-        models.Quotation.id != q.id
-    ).update({"status": "REJECTED"})
+    # create job (1 request -> 1 job)
+    if await db.scalar(select(models.Job.id).where(models.Job.request_id == req.id)):
+        raise HTTPException(409, "Job already exists for this request")
 
     q.status = "ACCEPTED"
-    req.status = "BOOKED"
+    try:
+        # compare-and-swap on the request's version, then (flush) on the quotation's,
+        # before anything else is written
+        booked = (await db.execute(
+            update(R).where(R.id == req.id, R.version == req.version)
+            .values(status="BOOKED", version=R.version + 1)
+            .execution_options(synchronize_session=False))).rowcount == 1
+        if booked:
+            await db.flush()
+    except OperationalError as exc:
+        if not is_lock_conflict(exc):
+            raise
+        booked = False  # SQLite: another accept committed since this transaction's snapshot
+    if not booked:
+        await db.rollback()
+        raise HTTPException(409, "Request was modified concurrently")
 
-    # create job (1 request -> 1 job)
-    if db.query(models.Job).filter(models.Job.request_id == req.id).first():
-        raise HTTPException(409, "Job already exists for this request")
+    # reject other quotations for same request
+    await db.execute(update(models.Quotation).where(
+        models.Quotation.request_id == req.id,
+        models.Quotation.id != q.id
+    ).values(status="REJECTED", version=models.Quotation.version + 1)
+     .execution_options(synchronize_session=False))
 
     job = models.Job(
         request_id=req.id,
@@ -270,60 +348,73 @@ def accept_quotation(quote_id: int, db: Session = Depends(get_db)):
         status="BOOKED",
     )
     db.add(job)
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
     return job
 
 # ---------- Jobs ----------
 @app.get("/jobs", response_model=list[schemas.JobOut])
-def list_jobs(db: Session = Depends(get_db)):
-    return db.query(models.Job).all()
+async def list_jobs(request: Request, response: Response, stream: bool = False,
+                    page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    fmt = stream_format(request, stream)
+    if fmt:
+        # full export: the page limit does not apply, ?after= still resumes
+        return stream_rows(models.Job, schemas.JobOut, fmt, after=page.after)
+    return await paginate(db, select(models.Job), page, response, schema=schemas.JobOut)
 
 @app.get("/jobs/{job_id}", response_model=schemas.JobOut)
-def get_job(job_id: int, db: Session = Depends(get_db)):
-    job = db.get(models.Job, job_id)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.Job, job_id)
     if not job:
         raise HTTPException(404, "Job not found")
     return job
 
+async def _set_job_completed(db: AsyncSession, job: models.Job, completed: bool):
+    # keep the technician's completed-job count (and so its rank score) in step
+    if completed != (job.status == "COMPLETED"):
+        await ranking.bump(db, job.technician_id, models.Technician.completed_jobs, 1 if completed else -1)
+        await ranking.refresh_static_score(db, job.technician_id)
+
 @app.put("/jobs/{job_id}", response_model=schemas.JobOut)
-def update_job(job_id: int, payload: schemas.JobUpdate, db: Session = Depends(get_db)):
-    job = db.get(models.Job, job_id)
+async def update_job(job_id: int, payload: schemas.JobUpdate, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.Job, job_id)
     if not job:
         raise HTTPException(404, "Job not found")
+    await _set_job_completed(db, job, payload.status == "COMPLETED")
     job.status = payload.status
     # keep request status in sync if completed
     if payload.status == "COMPLETED":
-        req = db.get(models.ServiceRequest, job.request_id)
+        req = await db.get(models.ServiceRequest, job.request_id)
         if req:
             req.status = "COMPLETED"
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
     return job
 
 @app.post("/jobs/{job_id}/complete", response_model=schemas.JobOut)
-def complete_job(job_id: int, db: Session = Depends(get_db)):
-    job = db.get(models.Job, job_id)
+async def complete_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.Job, job_id)
     if not job:
         raise HTTPException(404, "Job not found")
+    await _set_job_completed(db, job, True)
     job.status = "COMPLETED"
-    req = db.get(models.ServiceRequest, job.request_id)
+    req = await db.get(models.ServiceRequest, job.request_id)
     if req:
         req.status = "COMPLETED"
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
     return job
 
 # ---------- Reviews (Verified) ----------
 @app.post("/reviews", response_model=schemas.ReviewOut)
-def create_review(payload: schemas.ReviewCreate, db: Session = Depends(get_db)):
-    job = db.get(models.Job, payload.job_id)
+async def create_review(payload: schemas.ReviewCreate, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.Job, payload.job_id)
     if not job:
         raise HTTPException(404, "Job not found")
     if job.status != "COMPLETED":
         raise HTTPException(400, "Review allowed only when job is COMPLETED")
 
-    if db.query(models.Review).filter(models.Review.job_id == job.id).first():
+    if await db.scalar(select(models.Review).where(models.Review.job_id == job.id)):
         raise HTTPException(409, "Review already exists for this job")
 
     review = models.Review(
@@ -334,34 +425,28 @@ def create_review(payload: schemas.ReviewCreate, db: Session = Depends(get_db)):
         comment=payload.comment
     )
     db.add(review)
-    db.commit()
-    db.refresh(review)
+    await ratings.apply_review(db, review.technician_id, review.rating)
+    await ranking.refresh_static_score(db, review.technician_id)
+    await db.commit()
+    await db.refresh(review)
     return review
 
 @app.get("/technicians/{tech_id}/reviews", response_model=list[schemas.ReviewOut])
-def list_reviews(tech_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Review).filter(models.Review.technician_id == tech_id).all()
+async def list_reviews(tech_id: int, request: Request, response: Response, stream: bool = False,
+                       page: Page = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    fmt = stream_format(request, stream)
+    if fmt:
+        return stream_rows(models.Review, schemas.ReviewOut, fmt,
+                           models.Review.technician_id == tech_id, after=page.after)
+    return await paginate(db, select(models.Review).where(models.Review.technician_id == tech_id), page, response, schema=schemas.ReviewOut)
 
 @app.delete("/reviews/{review_id}")
-def delete_review(review_id: int, db: Session = Depends(get_db)):
-    r = db.get(models.Review, review_id)
+async def delete_review(review_id: int, db: AsyncSession = Depends(get_db)):
+    r = await db.get(models.Review, review_id)
     if not r:
         raise HTTPException(404, "Review not found")
-    db.delete(r)
-    db.commit()
+    await db.delete(r)
+    await ratings.apply_review(db, r.technician_id, r.rating, sign=-1)
+    await ranking.refresh_static_score(db, r.technician_id)
+    await db.commit()
     return {"deleted": True}
-
-# ---------- Price Estimation ----------
-@app.get("/price-estimate", response_model=schemas.PriceEstimateOut)
-def price_estimate(service_id: int, db: Session = Depends(get_db)):
-    # avg from quotations where request.service_id matches
-    avg_price, count = db.query(
-        func.avg(models.Quotation.price),
-        func.count(models.Quotation.id)
-    ).join(models.ServiceRequest, models.ServiceRequest.id == models.Quotation.request_id
-    ).filter(models.ServiceRequest.service_id == service_id).first()
-
-    if not count or count == 0:
-        return {"service_id": service_id, "average_price": 0.0, "sample_size": 0}
-
-    return {"service_id": service_id, "average_price": float(avg_price), "sample_size": int(count)}
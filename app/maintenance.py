@@ -0,0 +1,37 @@
+"""Maintenance commands for derived data.
+
+    python -m app.maintenance rebuild-ratings
+    python -m app.maintenance rebuild-ranking
+    python -m app.maintenance rebuild-price-stats
+    python -m app.maintenance compact-price-buckets
+    python -m app.maintenance purge-idempotency-keys
+"""
+import argparse
+import asyncio
+
+from .database import SessionLocal, engine
+from .idempotency import purge_idempotency_keys
+from .migrations import upgrade
+from .pricing import compact_price_buckets, rebuild_price_stats
+from .ranking import rebuild_ranking
+from .ratings import rebuild_ratings
+
+COMMANDS = {
+    "rebuild-ratings": rebuild_ratings,
+    "rebuild-ranking": rebuild_ranking,
+    "rebuild-price-stats": rebuild_price_stats,
+    "compact-price-buckets": compact_price_buckets,
+    "purge-idempotency-keys": purge_idempotency_keys,
+}
+
+async def run(command):
+    await upgrade()
+    async with SessionLocal() as db:
+        await COMMANDS[command](db)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    asyncio.run(run(parser.parse_args().command))
+    print("done")
@@ -0,0 +1,73 @@
+"""Bring an existing database up to the current models.
+
+Base.metadata.create_all only creates missing tables, so an app.db made by an
+older version keeps its old shape. upgrade() additionally creates missing
+indexes and adds missing columns (which need a server_default when NOT NULL).
+Derived tables and columns added that way start out empty, so the rebuild that
+fills them runs once, right after the upgrade that added them.
+
+    python -m app.migrations
+"""
+import asyncio
+
+from sqlalchemy import inspect, text
+
+from .database import Base, SessionLocal, engine
+from . import models
+from .pricing import ROLLUP_MODELS, rebuild_price_stats
+from .ranking import rebuild_ranking
+from .ratings import STAR_COLUMNS, rebuild_ratings
+
+T = models.Technician
+_RATING_COLUMNS = {f"technicians.{c.key}" for c in (T.rating_count, T.rating_sum, *STAR_COLUMNS.values())}
+_PRICE_ROLLUPS = {name for m in ROLLUP_MODELS
+                  for name in (m.__tablename__, *(f"{m.__tablename__}.{c.name}" for c in m.__table__.columns))}
+
+# (added tables / columns as "table.column", rebuild), in dependency order
+BACKFILLS = [
+    (_RATING_COLUMNS, rebuild_ratings),
+    # the static score reads the rating aggregates too
+    (_RATING_COLUMNS | {"technicians.completed_jobs", "technicians.cert_count", "technicians.rank_score"},
+     rebuild_ranking),
+    (_PRICE_ROLLUPS, rebuild_price_stats),
+]
+
+
+def upgrade_connection(conn):
+    """Create missing tables, columns and indexes; returns the set of what was added."""
+    added = set(Base.metadata.tables) - set(inspect(conn).get_table_names())
+    Base.metadata.create_all(bind=conn)
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            added.add(f"{table.name}.{col.name}")
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(conn.dialect)}"
+            if col.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {col.server_default.arg}"
+            conn.execute(text(ddl))
+        for ix in table.indexes:
+            ix.create(bind=conn, checkfirst=True)
+    return added
+
+
+async def backfill(added):
+    """Run the rebuilds of derived data that upgrade_connection just added empty."""
+    for triggers, rebuild in BACKFILLS:
+        if triggers & added:
+            async with SessionLocal() as db:
+                await rebuild(db)
+                await db.commit()
+
+
+async def upgrade(bind=engine):
+    async with bind.begin() as conn:
+        added = await conn.run_sync(upgrade_connection)
+    await backfill(added)
+
+
+if __name__ == "__main__":
+    asyncio.run(upgrade())
+    print("database is up to date")
@@ -1,6 +1,7 @@
-from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Text
+from sqlalchemy import String, Integer, Float, ForeignKey, Date, DateTime, Text, Index, LargeBinary, event, inspect, table, column, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from datetime import datetime
+from datetime import date, datetime
+from typing import Optional
 from .database import Base
 
 class User(Base):
@@ -27,14 +28,41 @@ class Technician(Base):
     lat: Mapped[float] = mapped_column(Float, default=0.0)
     lng: Mapped[float] = mapped_column(Float, default=0.0)
 
+    # rating aggregates, maintained by ratings.apply_review (rebuild: python -m app.maintenance)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    stars_1: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    stars_2: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    stars_3: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    stars_4: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    stars_5: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # ranking inputs and precomputed static score, see app/ranking.py
+    completed_jobs: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    cert_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    rank_score: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+
     user = relationship("User", back_populates="technician_profile")
     service = relationship("Service")
     certifications = relationship("Certification", back_populates="technician", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # backs the bounding-box prefilter of /technicians/search
+        Index("ix_technicians_service_lat_lng", "service_id", "lat", "lng"),
+    )
+
+    @property
+    def rating_average(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        # review counts for 1..5 stars
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
 class Certification(Base):
     __tablename__ = "certifications"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"))
+    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"), index=True)
     title: Mapped[str] = mapped_column(String(120))
     issuer: Mapped[str] = mapped_column(String(120))
     year: Mapped[int] = mapped_column(Integer)
@@ -44,7 +72,7 @@ class Certification(Base):
 class ServiceRequest(Base):
     __tablename__ = "service_requests"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
     title: Mapped[str] = mapped_column(String(120))
     description: Mapped[str] = mapped_column(Text)
@@ -52,33 +80,145 @@ class ServiceRequest(Base):
     lng: Mapped[float] = mapped_column(Float)
     status: Mapped[str] = mapped_column(String(20), default="OPEN")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # bumped only by accept_quotation's compare-and-swap to BOOKED, so other writes
+    # (quotations marking the request QUOTED, job updates) never conflict on it
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_service_requests_service_status", "service_id", "status"),
+    )
 
 class Quotation(Base):
     __tablename__ = "quotations"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    request_id: Mapped[int] = mapped_column(ForeignKey("service_requests.id"))
-    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"))
+    request_id: Mapped[int] = mapped_column(ForeignKey("service_requests.id"), index=True)
+    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"), index=True)
     price: Mapped[float] = mapped_column(Float)
     note: Mapped[str] = mapped_column(Text, default="")
     status: Mapped[str] = mapped_column(String(20), default="PENDING")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # optimistic lock: every ORM UPDATE is "... WHERE version = :seen", a miss raises StaleDataError
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    __mapper_args__ = {"version_id_col": version}
 
 class Job(Base):
     __tablename__ = "jobs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     request_id: Mapped[int] = mapped_column(ForeignKey("service_requests.id"), unique=True)
-    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"))
-    quotation_id: Mapped[int] = mapped_column(ForeignKey("quotations.id"))
+    quotation_id: Mapped[int] = mapped_column(ForeignKey("quotations.id"), index=True)
     status: Mapped[str] = mapped_column(String(20), default="BOOKED")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # technician_id lookups plus completed-job counts per technician
+        Index("ix_jobs_technician_status", "technician_id", "status"),
+    )
+
 class Review(Base):
     __tablename__ = "reviews"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     job_id: Mapped[int] = mapped_column(ForeignKey("jobs.id"), unique=True)
-    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"))
+    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    technician_id: Mapped[int] = mapped_column(ForeignKey("technicians.id"), index=True)
     rating: Mapped[int] = mapped_column(Integer)  # 1..5
     comment: Mapped[str] = mapped_column(Text, default="")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+# ---------- Price rollups ----------
+class PriceStatsMixin:
+    # running aggregates of quotation prices; see app/pricing.py
+    sample_size: Mapped[int] = mapped_column(Integer, default=0)
+    price_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    price_sum_sq: Mapped[float] = mapped_column(Float, default=0.0)
+    min_price: Mapped[float] = mapped_column(Float)
+    max_price: Mapped[float] = mapped_column(Float)
+    sketch: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # sketches.KLLSketch
+
+class PriceStats(PriceStatsMixin, Base):
+    __tablename__ = "price_stats"
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), primary_key=True)
+
+class PriceGeoStats(PriceStatsMixin, Base):
+    # per (service, lat/lng grid cell of the request) rollup for location-aware estimates
+    __tablename__ = "price_geo_stats"
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), primary_key=True)
+    cell_y: Mapped[int] = mapped_column(Integer, primary_key=True)
+    cell_x: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+class PriceDailyStats(PriceStatsMixin, Base):
+    # per (service, day) bucket for time-windowed estimates; old daily buckets are
+    # compacted into one bucket per month, starting on the 1st with days > 1
+    __tablename__ = "price_daily_stats"
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    days: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+
+# ---------- Idempotency keys ----------
+class IdempotencyKey(Base):
+    # stored 2xx response of a POST sent with an Idempotency-Key header; see app/idempotency.py
+    __tablename__ = "idempotency_keys"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64))  # sha256 of method, path, query, body
+    status_code: Mapped[int] = mapped_column(Integer)
+    content_type: Mapped[str] = mapped_column(String(100), default="")
+    body: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+# ---------- Optional SQLite R*Tree geo index ----------
+# Each mirror is an rtree virtual table (id, min_lat, max_lat, min_lng, max_lng, +service_id)
+# kept in sync with the ORM table through mapper events once enable_rtree() has run.
+RTREE_MIRRORS = {
+    Technician: "technicians_rtree",
+    ServiceRequest: "service_requests_rtree",
+}
+
+def rtree_table(name):
+    return table(name, column("id"), column("min_lat"), column("max_lat"),
+                 column("min_lng"), column("max_lng"), column("service_id"))
+
+def _rtree_insert(model):
+    return text(f"INSERT OR REPLACE INTO {RTREE_MIRRORS[model]} "
+                "VALUES (:id, :lat, :lat, :lng, :lng, :service_id)")
+
+def _rtree_params(obj):
+    return {"id": obj.id, "lat": obj.lat, "lng": obj.lng, "service_id": obj.service_id}
+
+def _rtree_upsert(mapper, connection, target):
+    connection.execute(_rtree_insert(mapper.class_), _rtree_params(target))
+
+def rtree_bulk_upsert(session, model, objs):
+    """Mirror rows written by bulk INSERT statements, which do not fire mapper events."""
+    if objs and event.contains(model, "after_insert", _rtree_upsert):
+        session.connection().execute(_rtree_insert(model), [_rtree_params(o) for o in objs])
+
+def _rtree_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[k].history.has_changes() for k in ("lat", "lng", "service_id")):
+        _rtree_upsert(mapper, connection, target)
+
+def _rtree_delete(mapper, connection, target):
+    connection.execute(
+        text(f"DELETE FROM {RTREE_MIRRORS[mapper.class_]} WHERE id = :id"), {"id": target.id}
+    )
+
+def enable_rtree(conn):
+    """Create the R*Tree mirrors, resync them from the base tables and start maintaining them."""
+    for model, name in RTREE_MIRRORS.items():
+        base = model.__tablename__
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} "
+            "USING rtree(id, min_lat, max_lat, min_lng, max_lng, +service_id)"
+        ))
+        conn.execute(text(f"DELETE FROM {name}"))
+        conn.execute(text(
+            f"INSERT INTO {name} SELECT id, lat, lat, lng, lng, service_id FROM {base}"
+        ))
+    for model in RTREE_MIRRORS:
+        if not event.contains(model, "after_insert", _rtree_upsert):
+            event.listen(model, "after_insert", _rtree_upsert)
+            event.listen(model, "after_update", _rtree_update)
+            event.listen(model, "after_delete", _rtree_delete)
@@ -0,0 +1,64 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+from .fastjson import FastJSONResponse, projection, to_dicts
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+@dataclass
+class Page:
+    limit: int
+    after: Optional[int]
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, _, value = raw.partition(":")
+        if kind != "id":
+            raise ValueError(cursor)
+        return int(value)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(400, "Invalid cursor")
+
+def page_params(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+) -> Page:
+    return Page(limit=limit, after=decode_cursor(after) if after else None)
+
+async def paginate(db, stmt, page: Page, response: Response, schema=None):
+    """Keyset page of stmt ordered by the entity's primary key.
+
+    Seeks past the cursor (WHERE id > :after) instead of OFFSET, so every page costs
+    the same however deep the client has paged. Sets X-Next-Cursor when more rows exist.
+
+    With schema, takes the fast path (see app/fastjson.py): selects only schema's
+    columns and returns the page already encoded as a FastJSONResponse.
+    """
+    entity = stmt.column_descriptions[0]["entity"]
+    pk = entity.id
+    if page.after is not None:
+        stmt = stmt.where(pk > page.after)
+    stmt = stmt.order_by(pk).limit(page.limit + 1)
+    if schema is None:
+        rows = (await db.scalars(stmt)).all()
+    else:
+        rows = (await db.execute(stmt.with_only_columns(*projection(schema, entity)[0]))).all()
+    headers = {}
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    if schema is not None:
+        # a returned Response bypasses the injected one, so it carries the cursor itself
+        return FastJSONResponse(to_dicts(schema, entity, rows), headers=headers)
+    response.headers.update(headers)
+    return rows
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import math
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import SessionLocal, get_db
+from . import models, schemas
+from .geo import cell_of, covering_cells
+from .querystats import TimedRoute
+from .sketches import KLLSketch
+from .utils import haversine_km
+
+router = APIRouter(tags=["pricing"], route_class=TimedRoute)
+log = logging.getLogger(__name__)
+
+PERCENTILES = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+
+@dataclass
+class Rollup:
+    """In-memory price rollup; rows of every rollup table merge into one of these."""
+    sample_size: int = 0
+    price_sum: float = 0.0
+    price_sum_sq: float = 0.0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    sketch: Optional[KLLSketch] = None
+
+    @classmethod
+    def of(cls, row):
+        return cls(row.sample_size, row.price_sum, row.price_sum_sq, row.min_price, row.max_price,
+                   KLLSketch.from_bytes(row.sketch) if row.sketch else None)
+
+    def add(self, price):
+        self.merge(Rollup(1, price, price * price, price, price, None))
+        if self.sketch is None:
+            self.sketch = KLLSketch()
+        self.sketch.update(price)
+
+    def merge(self, other):
+        if not other.sample_size:
+            return self
+        self.min_price = other.min_price if self.min_price is None else min(self.min_price, other.min_price)
+        self.max_price = other.max_price if self.max_price is None else max(self.max_price, other.max_price)
+        self.sample_size += other.sample_size
+        self.price_sum += other.price_sum
+        self.price_sum_sq += other.price_sum_sq
+        if other.sketch is not None:
+            self.sketch = other.sketch if self.sketch is None else self.sketch.merge(other.sketch)
+        return self
+
+    def columns(self):
+        return {
+            "sample_size": self.sample_size, "price_sum": self.price_sum,
+            "price_sum_sq": self.price_sum_sq, "min_price": self.min_price,
+            "max_price": self.max_price, "sketch": self.sketch.to_bytes() if self.sketch else None,
+        }
+
+def _upsert(db: AsyncSession):
+    return sqlite_insert if db.bind.dialect.name == "sqlite" else pg_insert
+
+async def _accumulate(db: AsyncSession, model, keys: dict, price: float):
+    """Fold one price into the rollup row identified by keys (INSERT ... ON CONFLICT)."""
+    t = model.__table__
+    stmt = _upsert(db)(t).values(
+        **keys, sample_size=1, price_sum=price, price_sum_sq=price * price,
+        min_price=price, max_price=price,
+    )
+    ex = stmt.excluded
+    await db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_={
+        "sample_size": t.c.sample_size + 1,
+        "price_sum": t.c.price_sum + ex.price_sum,
+        "price_sum_sq": t.c.price_sum_sq + ex.price_sum_sq,
+        "min_price": case((ex.min_price < t.c.min_price, ex.min_price), else_=t.c.min_price),
+        "max_price": case((ex.max_price > t.c.max_price, ex.max_price), else_=t.c.max_price),
+    }))
+    # the upsert above already holds the row's write lock, so this read-modify-write
+    # of the sketch cannot interleave with another quotation's
+    where = [t.c[k] == v for k, v in keys.items()]
+    blob = await db.scalar(select(t.c.sketch).where(*where))
+    sketch = KLLSketch.from_bytes(blob) if blob else KLLSketch()
+    sketch.update(price)
+    await db.execute(t.update().where(*where).values(sketch=sketch.to_bytes()))
+
+ROLLUP_MODELS = (models.PriceStats, models.PriceGeoStats, models.PriceDailyStats)
+
+def _rollup_keys(service_id: int, lat: float, lng: float, day):
+    # (model, primary key) of every rollup row a quotation at (lat, lng) on day contributes to
+    cell_y, cell_x = cell_of(lat, lng, settings.price_cell_deg)
+    return [
+        (models.PriceStats, {"service_id": service_id}),
+        (models.PriceGeoStats, {"service_id": service_id, "cell_y": cell_y, "cell_x": cell_x}),
+        (models.PriceDailyStats, {"service_id": service_id, "day": day}),
+    ]
+
+async def record_quotation(db: AsyncSession, req: models.ServiceRequest, price: float):
+    """Update every price rollup for a new quotation, in the caller's transaction."""
+    for model, keys in _rollup_keys(req.service_id, req.lat, req.lng, datetime.utcnow().date()):
+        await _accumulate(db, model, keys, price)
+
+async def _recompute(db: AsyncSession, model, keys: dict):
+    """Rewrite one rollup row from the quotations feeding it (removing it if none are left)."""
+    Q, R = models.Quotation, models.ServiceRequest
+    t = model.__table__
+    stmt = select(R.lat, R.lng, Q.price).join(R, R.id == Q.request_id).where(R.service_id == keys["service_id"])
+    if model is models.PriceGeoStats:
+        # range on the cell's edges, padded a cell each way; cell_of() below has the last word
+        deg = settings.price_cell_deg
+        stmt = stmt.where(R.lat.between((keys["cell_y"] - 1) * deg, (keys["cell_y"] + 2) * deg),
+                          R.lng.between((keys["cell_x"] - 1) * deg, (keys["cell_x"] + 2) * deg))
+    elif model is models.PriceDailyStats:
+        days = await db.scalar(select(t.c.days).where(*[t.c[k] == v for k, v in keys.items()])) or 1
+        start = datetime.combine(keys["day"], datetime.min.time())
+        stmt = stmt.where(Q.created_at >= start, Q.created_at < start + timedelta(days=days))
+    rollup = Rollup()
+    for lat, lng, price in await db.execute(stmt):
+        if model is not models.PriceGeoStats or \
+                cell_of(lat, lng, settings.price_cell_deg) == (keys["cell_y"], keys["cell_x"]):
+            rollup.add(price)
+    where = [t.c[k] == v for k, v in keys.items()]
+    if rollup.sample_size:
+        await db.execute(t.update().where(*where).values(**rollup.columns()))
+    else:
+        await db.execute(t.delete().where(*where))
+
+async def forget_request(db: AsyncSession, req: models.ServiceRequest):
+    """Take a deleted request's quotations out of every price rollup, in the caller's
+    transaction (after the delete is flushed).
+
+    min, max and the sketch cannot be decremented, so each affected row is recomputed
+    from the quotations left, as rebuild_price_stats would.
+    """
+    Q, D = models.Quotation, models.PriceDailyStats
+    created = (await db.scalars(select(Q.created_at).where(Q.request_id == req.id))).all()
+    affected = {}
+    for created_at in created:
+        for model, keys in _rollup_keys(req.service_id, req.lat, req.lng, created_at.date()):
+            if model is D:
+                # the day may have been compacted into its month's bucket
+                keys["day"] = await db.scalar(select(D.day).where(
+                    D.service_id == req.service_id, D.day <= keys["day"],
+                ).order_by(D.day.desc()).limit(1)) or keys["day"]
+            affected[model, tuple(keys.items())] = keys
+    for model, keys in affected:
+        await _recompute(db, model, dict(keys))
+
+def summarize(stats) -> dict:
+    """average / stddev (sample) / min / max / percentiles of a Rollup."""
+    n = stats.sample_size if stats else 0
+    if not n:
+        return {"average_price": 0.0, "sample_size": 0}
+    mean = stats.price_sum / n
+    var = (stats.price_sum_sq - n * mean * mean) / (n - 1) if n > 1 else 0.0
+    out = {
+        "average_price": mean,
+        "sample_size": n,
+        "stddev": math.sqrt(max(var, 0.0)),
+        "min_price": stats.min_price,
+        "max_price": stats.max_price,
+    }
+    if stats.sketch is not None:
+        out.update(zip(PERCENTILES, stats.sketch.quantiles(list(PERCENTILES.values()))))
+    return out
+
+async def rebuild_price_stats(db: AsyncSession):
+    """Recompute every price rollup table from the quotations, in one pass."""
+    Q, R = models.Quotation, models.ServiceRequest
+    rollups = {}  # (model, key items) -> Rollup
+    rows = await db.stream(
+        select(R.service_id, R.lat, R.lng, Q.created_at, Q.price).join(R, R.id == Q.request_id))
+    async for service_id, lat, lng, created_at, price in rows:
+        for model, keys in _rollup_keys(service_id, lat, lng, created_at.date()):
+            rollups.setdefault((model, tuple(keys.items())), Rollup()).add(price)
+
+    for model in ROLLUP_MODELS:
+        await db.execute(delete(model))
+        values = [{**dict(keys), **r.columns()} for (m, keys), r in rollups.items() if m is model]
+        if values:
+            await db.execute(insert(model), values)
+    await compact_price_buckets(db)
+
+async def compact_price_buckets(db: AsyncSession, today=None) -> int:
+    """Merge daily buckets of months older than the retention period into month buckets."""
+    D = models.PriceDailyStats
+    today = today or datetime.utcnow().date()
+    cutoff = (today - timedelta(days=settings.price_daily_retention_days)).replace(day=1)
+    rows = (await db.scalars(select(D).where(D.day < cutoff))).all()
+    months = {}  # (service_id, first of month) -> [rows]
+    for row in rows:
+        months.setdefault((row.service_id, row.day.replace(day=1)), []).append(row)
+    # a month already reduced to its single month bucket has nothing left to merge
+    months = {k: v for k, v in months.items() if any(r.days == 1 for r in v)}
+    for (service_id, month), group in months.items():
+        merged = Rollup()
+        for row in group:
+            merged.merge(Rollup.of(row))
+            await db.delete(row)
+        await db.flush()
+        next_month = (month + timedelta(days=31)).replace(day=1)
+        db.add(D(service_id=service_id, day=month, days=(next_month - month).days, **merged.columns()))
+    await db.commit()
+    return len(months)
+
+async def compaction_loop():
+    """Background task (started in the app lifespan) compacting price buckets periodically."""
+    while True:
+        await asyncio.sleep(settings.price_compact_interval_s)
+        try:
+            async with SessionLocal() as db:
+                await compact_price_buckets(db)
+        except Exception:
+            log.exception("price bucket compaction failed")
+
+def _nearest_lng(lng: float, lo: float, hi: float) -> float:
+    # longitude in lo..hi closest to lng, going either way around the antimeridian
+    if lo <= lng <= hi:
+        return lng
+    return min((lo, hi), key=lambda edge: abs((edge - lng + 180) % 360 - 180))
+
+async def _nearby_estimate(db: AsyncSession, service_id: int, lat: float, lng: float, radius_km: float):
+    # one primary-key range read of every cell in the radius' bounding box, then widen
+    # nearest-cell-first in memory until enough quotations are covered
+    cells = list(covering_cells(lat, lng, radius_km, settings.price_cell_deg))
+    G = models.PriceGeoStats
+    rows = (await db.scalars(select(G).where(
+        G.service_id == service_id,
+        G.cell_y.between(cells[0][0], cells[-1][0]),
+        # explicit columns: near the antimeridian they come from both ends of the range
+        G.cell_x.in_(sorted({x for _, x in cells})),
+    ))).all()
+
+    deg = settings.price_cell_deg
+    ring = sorted(
+        # distance to the nearest point of each cell, so the query's own cell is 0 km away
+        (haversine_km(lat, lng, min(max(lat, row.cell_y * deg), (row.cell_y + 1) * deg),
+                      _nearest_lng(lng, row.cell_x * deg, (row.cell_x + 1) * deg)), row)
+        for row in rows
+    )
+    merged, covered_km = Rollup(), 0.0
+    for d, row in ring:
+        if d > radius_km:
+            break
+        merged.merge(Rollup.of(row))
+        # reported radius: the farthest corner of any merged cell
+        covered_km = max(covered_km, *(
+            haversine_km(lat, lng, y * deg, x * deg)
+            for y in (row.cell_y, row.cell_y + 1) for x in (row.cell_x, row.cell_x + 1)
+        ))
+        if merged.sample_size >= settings.price_min_samples:
+            break
+    return {**summarize(merged), "radius_km": round(covered_km, 3)}
+
+@router.get("/price-estimate/trend", response_model=schemas.PriceTrendOut)
+async def price_trend(
+    service_id: int,
+    window: int = Query(30, ge=1, le=3650, description="Days back from today, inclusive"),
+    interval: str = Query("day", pattern="^(day|month)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    # sums at most one bucket per day (per month past the retention period) instead of
+    # every quotation in the window
+    D = models.PriceDailyStats
+    start = datetime.utcnow().date() - timedelta(days=window - 1)
+    rows = (await db.scalars(
+        select(D).where(D.service_id == service_id, D.day >= start - timedelta(days=31)).order_by(D.day)
+    )).all()
+    total, points = Rollup(), {}
+    for row in rows:
+        if row.day + timedelta(days=row.days) <= start:
+            continue  # month bucket ending before the window
+        bucket = Rollup.of(row)
+        key = row.day if interval == "day" else row.day.replace(day=1)
+        points.setdefault(key, Rollup()).merge(replace(bucket, sketch=None))  # points skip percentiles
+        total.merge(bucket)
+    return {
+        "service_id": service_id, "window_days": window, "interval": interval, **summarize(total),
+        "points": [
+            {"start": key, "average_price": r.price_sum / r.sample_size, "sample_size": r.sample_size,
+             "min_price": r.min_price, "max_price": r.max_price}
+            for key, r in points.items()
+        ],
+    }
+
+@router.get("/price-estimate", response_model=schemas.PriceEstimateOut)
+async def price_estimate(
+    service_id: int,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, description="Widest area to draw quotations from"),
+    db: AsyncSession = Depends(get_db),
+):
+    if (lat is None) != (lng is None):
+        raise HTTPException(422, "lat and lng must be given together")
+    if lat is not None:
+        radius_km = min(radius_km or settings.price_max_radius_km, settings.price_max_radius_km)
+        return {"service_id": service_id, **await _nearby_estimate(db, service_id, lat, lng, radius_km)}
+    # single primary-key read of the running aggregates
+    stats = await db.get(models.PriceStats, service_id)
+    return {"service_id": service_id, **summarize(Rollup.of(stats) if stats else None)}
@@ -0,0 +1,194 @@
+"""Per-request SQL accounting, timing and repeated-statement (N+1) detection.
+
+QueryStatsMiddleware opens a RequestStats for every HTTP request; the engine's
+cursor listeners (see app/database.py) record each statement and its duration
+into it. When one statement shape runs more than sql_repeat_threshold times in
+a request it is logged, and with sql_repeat_raise the statement fails instead.
+
+Every response carries a Server-Timing header (db, handler, serialize, total),
+and a sample of requests is logged as one JSON line each on "app.requests".
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Optional
+
+from fastapi.routing import APIRoute
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+request_log = logging.getLogger("app.requests")
+
+# IN lists and multi-row VALUES vary in length with the data, not the call site
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s)\s*,?)+\)")
+
+
+class RepeatedQueryError(RuntimeError):
+    """One request ran the same statement more than sql_repeat_threshold times."""
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    # cached: compiled statements are reused, so the same strings come back constantly
+    return _PARAM_LIST.sub("(?)", " ".join(statement.split()))
+
+
+class RequestStats:
+    __slots__ = ("route", "statements", "shapes", "started", "db_s", "serialize_s",
+                 "handler_done", "head_at")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.statements = 0
+        self.shapes = Counter()
+        self.started = time.perf_counter()
+        self.db_s = 0.0
+        self.serialize_s = 0.0
+        self.handler_done = None  # when the endpoint function returned
+        self.head_at = None       # when the response head went out
+
+    def record(self, statement: str):
+        self.statements += 1
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.shapes[shape] == settings.sql_repeat_threshold + 1:
+            log.warning("%s ran the same statement more than %d times (N+1?): %s",
+                        self.route, settings.sql_repeat_threshold, shape)
+            if settings.sql_repeat_raise:
+                raise RepeatedQueryError(f"{self.route}: {shape}")
+
+    def response_started(self):
+        self.head_at = time.perf_counter()
+        if self.handler_done is not None:
+            # response_model validation, dump and JSON encoding happen after the endpoint returns
+            self.serialize_s += self.head_at - self.handler_done
+
+    def timings_ms(self, until):
+        total = (until - self.started) * 1000
+        serialize = self.serialize_s * 1000
+        return {"db": self.db_s * 1000, "handler": total - serialize, "serialize": serialize, "total": total}
+
+    def server_timing(self) -> str:
+        t = self.timings_ms(self.head_at)
+        return (f'db;dur={t["db"]:.2f};desc="{self.statements} statements", handler;dur={t["handler"]:.2f}, '
+                f'serialize;dur={t["serialize"]:.2f}, total;dur={t["total"]:.2f}')
+
+
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current.get()
+    if stats is not None:
+        stats.record(statement)
+        context._stats_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current.get()
+    started = getattr(context, "_stats_started", None)
+    if stats is not None and started is not None:
+        stats.db_s += time.perf_counter() - started
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serialization time of the current request."""
+    stats = current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialize_s += time.perf_counter() - started
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that notes when its endpoint returns, splitting handler from serialization time."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @wraps(call)
+            async def timed(*a, **kw):
+                result = await call(*a, **kw)
+                _handler_done()
+                return result
+        else:
+            @wraps(call)
+            def timed(*a, **kw):
+                result = call(*a, **kw)
+                _handler_done()
+                return result
+        self.dependant.call = timed
+
+
+def _handler_done():
+    stats = current.get()
+    if stats is not None:
+        stats.handler_done = time.perf_counter()
+
+
+def _log_request(scope, stats: RequestStats, status: int):
+    finished = time.perf_counter()
+    t = stats.timings_ms(finished)
+    # errors and slow requests always; the rest sampled to keep logging off the hot path
+    if not (status >= 500 or t["total"] >= settings.request_log_slow_ms
+            or random.random() < settings.request_log_sample_rate):
+        return
+    route = scope.get("route")
+    request_log.info(json.dumps({
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": getattr(route, "path", None),
+        "status": status,
+        "statements": stats.statements,
+        **{f"{name}_ms": round(ms, 2) for name, ms in t.items()},
+    }))
+
+
+def default_request_log():
+    """Send "app.requests" lines to stderr unless a logging config already routes them."""
+    if not request_log.handlers:
+        request_log.addHandler(logging.StreamHandler())
+        request_log.setLevel(logging.INFO)
+        request_log.propagate = False
+
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware scoping a RequestStats to each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.request_stats:
+            return await self.app(scope, receive, send)
+        stats = RequestStats(f"{scope['method']} {scope['path']}")
+        token = current.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                # streamed bodies are still being produced here; the log line has their full time
+                status = message["status"]
+                stats.response_started()
+                message["headers"] = [*message.get("headers", []),
+                                      (b"server-timing", stats.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current.reset(token)
+            _log_request(scope, stats, status)
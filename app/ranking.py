@@ -0,0 +1,79 @@
+"""Ranking score for technician search.
+
+score = static part (precomputed into Technician.rank_score) - distance term
+
+The static part mixes a Bayesian-smoothed rating, completed jobs and
+certifications, each scaled to 0..1. It only changes on review, job or
+certification writes, which call refresh_static_score(); a ranked search then
+only computes the distance term per candidate.
+"""
+import math
+
+from sqlalchemy import bindparam, func, select, update
+
+from . import models
+
+T = models.Technician
+
+PRIOR_MEAN = 4.0      # assumed rating of a technician with no reviews
+PRIOR_WEIGHT = 5      # reviews needed before a technician's own average dominates
+JOBS_SATURATION = 100
+CERTS_SATURATION = 5
+
+W_RATING = 0.5
+W_JOBS = 0.3
+W_CERTS = 0.2
+W_DISTANCE = 0.5      # a candidate at the search radius loses this much
+
+def bayesian_rating(rating_sum, rating_count):
+    return (PRIOR_WEIGHT * PRIOR_MEAN + (rating_sum or 0)) / (PRIOR_WEIGHT + (rating_count or 0))
+
+def static_score(tech) -> float:
+    rating = (bayesian_rating(tech.rating_sum, tech.rating_count) - 1) / 4
+    jobs = min(1.0, math.log1p(tech.completed_jobs or 0) / math.log1p(JOBS_SATURATION))
+    certs = min(1.0, (tech.cert_count or 0) / CERTS_SATURATION)
+    return W_RATING * rating + W_JOBS * jobs + W_CERTS * certs
+
+def score(rank_score: float, distance_km: float, radius_km: float) -> float:
+    return rank_score - W_DISTANCE * distance_km / radius_km
+
+async def bump(db, technician_id: int, column, delta: int):
+    """Relative update of a technician counter (completed_jobs / cert_count)."""
+    await db.execute(update(T).where(T.id == technician_id).values({column: column + delta})
+                     .execution_options(synchronize_session=False))
+
+async def refresh_static_score(db, technician_id: int):
+    # populate_existing: the counters were just changed by relative UPDATEs
+    tech = await db.get(T, technician_id, populate_existing=True)
+    if tech is not None:
+        tech.rank_score = static_score(tech)
+
+async def bump_many(db, column, deltas: dict):
+    """bump() for many technicians ({technician_id: delta}) as one executemany."""
+    t = T.__table__
+    await db.execute(
+        update(t).where(t.c.id == bindparam("tid")).values({column.key: t.c[column.key] + bindparam("delta")}),
+        [{"tid": tech_id, "delta": delta} for tech_id, delta in deltas.items()],
+    )
+
+async def refresh_static_scores(db, technician_ids):
+    """refresh_static_score() for many technicians: one SELECT and one bulk UPDATE."""
+    rows = await db.execute(select(T.id, T.rating_sum, T.rating_count, T.completed_jobs, T.cert_count)
+                            .where(T.id.in_(technician_ids)))
+    scores = [{"id": row.id, "rank_score": static_score(row)} for row in rows]
+    if scores:
+        await db.execute(update(T), scores)
+
+async def rebuild_ranking(db):
+    """Recount completed jobs and certifications, then recompute every static score."""
+    J, C = models.Job, models.Certification
+    await db.execute(update(T).values({
+        T.completed_jobs: select(func.count(J.id))
+            .where(J.technician_id == T.id, J.status == "COMPLETED").scalar_subquery(),
+        T.cert_count: select(func.count(C.id)).where(C.technician_id == T.id).scalar_subquery(),
+    }).execution_options(synchronize_session=False))
+    rows = await db.execute(select(T.id, T.rating_sum, T.rating_count, T.completed_jobs, T.cert_count))
+    scores = [{"id": row.id, "rank_score": static_score(row)} for row in rows]
+    if scores:
+        await db.execute(update(T), scores)
+    await db.commit()
@@ -0,0 +1,35 @@
+from sqlalchemy import func, select, update
+
+from . import models
+
+T = models.Technician
+STAR_COLUMNS = {1: T.stars_1, 2: T.stars_2, 3: T.stars_3, 4: T.stars_4, 5: T.stars_5}
+
+async def apply_review(db, technician_id: int, rating: int, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one review from the technician's aggregates.
+
+    A single relative UPDATE in the caller's transaction, so concurrent reviews
+    cannot lose increments and the aggregates commit together with the review.
+    """
+    star = STAR_COLUMNS[rating]
+    await db.execute(update(T).where(T.id == technician_id).values({
+        T.rating_count: T.rating_count + sign,
+        T.rating_sum: T.rating_sum + sign * rating,
+        star: star + sign,
+    }).execution_options(synchronize_session=False))
+
+async def rebuild_ratings(db):
+    """Recompute every technician's aggregates from the reviews table in one UPDATE."""
+    R = models.Review
+
+    def per_tech(expr, *where):
+        return (
+            select(func.coalesce(expr, 0)).where(R.technician_id == T.id, *where).scalar_subquery()
+        )
+
+    await db.execute(update(T).values({
+        T.rating_count: per_tech(func.count(R.id)),
+        T.rating_sum: per_tech(func.sum(R.rating)),
+        **{col: per_tech(func.count(R.id), R.rating == star) for star, col in STAR_COLUMNS.items()},
+    }).execution_options(synchronize_session=False))
+    await db.commit()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime
+from typing import Generic, List, Optional, TypeVar
+from datetime import date, datetime
 
 # ---- Users ----
 class UserCreate(BaseModel):
@@ -50,15 +50,26 @@ class TechnicianOut(BaseModel):
     service_id: int
     lat: float
     lng: float
+    rating_count: int = 0
+    rating_average: Optional[float] = None
+    rating_histogram: List[int] = [0, 0, 0, 0, 0]  # reviews with 1..5 stars
+    completed_jobs: int = 0
+    cert_count: int = 0
     class Config:
         from_attributes = True
 
+class TechnicianNearOut(TechnicianOut):
+    distance_km: float = 0.0
+
 # ---- Certifications ----
 class CertificationCreate(BaseModel):
     title: str
     issuer: str
     year: int
 
+class CertificationBatchItem(CertificationCreate):
+    technician_id: int
+
 class CertificationOut(BaseModel):
     id: int
     technician_id: int
@@ -144,8 +155,42 @@ class ReviewOut(BaseModel):
     class Config:
         from_attributes = True
 
+# ---- Technician profile ----
+class TechnicianProfileOut(TechnicianOut):
+    service_name: Optional[str] = None
+    certifications: List[CertificationOut] = []
+    recent_reviews: List[ReviewOut] = []  # newest first
+
 # ---- Price Estimate ----
 class PriceEstimateOut(BaseModel):
     service_id: int
     average_price: float
     sample_size: int
+    stddev: float = 0.0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    p10: Optional[float] = None
+    p50: Optional[float] = None  # median
+    p90: Optional[float] = None
+    radius_km: Optional[float] = None  # area actually drawn from for lat/lng estimates
+
+class PriceTrendPoint(BaseModel):
+    start: date  # first day of the day/month bucket
+    average_price: float
+    sample_size: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class PriceTrendOut(PriceEstimateOut):
+    window_days: int
+    interval: str
+    points: List[PriceTrendPoint] = []  # only buckets that have quotations, oldest first
+
+# ---- Bulk create ----
+T = TypeVar("T")
+
+class BatchItemOut(BaseModel, Generic[T]):
+    index: int   # position in the submitted list
+    status: int  # what the single-item endpoint would have answered
+    detail: Optional[str] = None
+    item: Optional[T] = None
@@ -0,0 +1,244 @@
+import asyncio
+import math
+from array import array
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import func, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import get_db
+from . import models, ranking, schemas
+from .fastjson import FastJSONResponse, fields_param, projection, to_dicts
+from .geo import covering_cell_count, rtree_overlaps, tech_index
+from .querystats import TimedRoute
+from .utils import KM_PER_DEG_LAT, TTLCache, bounding_box, haversine_km, lng_ranges, within_radius
+
+router = APIRouter(prefix="/technicians", tags=["search"], route_class=TimedRoute)
+
+NEAREST_START_KM = 2.0
+MAX_RADIUS_KM = 20038.0  # half the equator: covers the whole globe
+PLAN_HEADER = "X-Search-Plan"
+
+# cache_key(...) -> (ids, lats, lngs) of the candidates around the key's circle
+search_cache = TTLCache(settings.search_cache_size, settings.search_cache_ttl_s)
+# service_id -> technician count, the planner's density signal (may lag writes by the TTL)
+service_sizes = TTLCache(settings.search_cache_size, settings.search_cache_ttl_s)
+
+
+# one load of tech_index at a time, so each rebuild replays every write made since its snapshot
+_tech_index_load = asyncio.Lock()
+
+
+def technician_saved(tech: models.Technician):
+    if settings.geo_backend == "grid":
+        tech_index.upsert(tech.id, tech.service_id, tech.lat, tech.lng)
+    search_cache.clear()
+
+def technician_deleted(tech_id: int):
+    if settings.geo_backend == "grid":
+        tech_index.remove(tech_id)
+    search_cache.clear()
+
+
+async def _ensure_tech_index(db: AsyncSession):
+    if tech_index.loaded:
+        return
+    async with _tech_index_load:
+        if tech_index.loaded:
+            return
+        tech_index.begin_load()
+        rows = (await db.execute(select(
+            models.Technician.id, models.Technician.service_id,
+            models.Technician.lat, models.Technician.lng,
+        ))).all()
+        tech_index.rebuild(rows)
+
+async def _hydrate(db: AsyncSession, hits, columns=None):
+    # hits: [(tech_id, distance_km)] -> [(Technician, distance_km)] in the same order,
+    # or [(Row of columns, distance_km)] when only some columns are needed
+    if not hits:
+        return []
+    T = models.Technician
+    where = T.id.in_([tech_id for tech_id, _ in hits])
+    if columns is None:
+        rows = await db.scalars(select(T).where(where))
+    else:
+        rows = await db.execute(select(*columns).where(where))
+    techs = {t.id: t for t in rows}
+    return [(techs[tech_id], d) for tech_id, d in hits if tech_id in techs]
+
+def cache_key(service_id: int, lat: float, lng: float, radius_km: float):
+    """Searches within a few hundred metres and 0.1 km of radius of each other share a key."""
+    decimals = settings.search_cache_decimals
+    return service_id, round(lat, decimals), round(lng, decimals), math.ceil(radius_km * 10) / 10
+
+def _key_circle(key):
+    # a circle holding the circle of every search with this key: its centre is at most
+    # a rounding step away in each coordinate and its radius is no larger
+    service_id, lat, lng, radius_km = key
+    return service_id, lat, lng, radius_km + KM_PER_DEG_LAT * 10 ** -settings.search_cache_decimals
+
+async def _service_size(db: AsyncSession, service_id: int):
+    if settings.geo_backend == "grid":
+        await _ensure_tech_index(db)
+        return tech_index.size(service_id)
+    size = service_sizes.get(service_id)
+    if size is None:
+        T = models.Technician
+        size = await db.scalar(select(func.count()).select_from(T).where(T.service_id == service_id))
+        service_sizes.set(service_id, size)
+    return size
+
+async def plan_search(db: AsyncSession, service_id: int, lat: float, lng: float, radius_km: float):
+    """Pick how to answer a radius search: "cache", "bbox" or the configured geo index."""
+    if search_cache.get(cache_key(service_id, lat, lng, radius_km)) is not None:
+        return "cache"
+    # wide circles touch too many grid cells / rtree nodes; one index range scan wins
+    if settings.geo_backend == "bbox" or radius_km >= settings.search_bbox_radius_km:
+        return "bbox"
+    # so does a sparse service: the (service_id, lat, lng) range scan reads at most its
+    # technicians, fewer than the cells the circle covers
+    if await _service_size(db, service_id) <= covering_cell_count(lat, lng, radius_km, tech_index.cell_deg):
+        return "bbox"
+    return settings.geo_backend
+
+async def _candidates(db: AsyncSession, plan: str, service_id: int, lat: float, lng: float, radius_km: float):
+    """(ids, lats, lngs) of a superset of the technicians within radius_km found following plan
+    ("service": its whole range)."""
+    if plan == "grid":
+        # grid cells narrow the candidates in memory
+        await _ensure_tech_index(db)
+        return tech_index.candidates(service_id, lat, lng, radius_km)
+
+    T = models.Technician
+    if plan == "rtree":
+        rt = models.rtree_table("technicians_rtree")
+        # one R*Tree lookup per side of the antimeridian
+        lookups = [select(T.id, T.lat, T.lng).join(rt, rt.c.id == T.id).where(*where)
+                   for where in rtree_overlaps(rt, service_id, lat, lng, radius_km)]
+        candidates = lookups[0] if len(lookups) == 1 else union(*lookups)
+    elif plan == "service":
+        candidates = select(T.id, T.lat, T.lng).where(T.service_id == service_id)
+    else:
+        # indexed range scan on (service_id, lat, lng); exact distance check afterwards
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        candidates = select(T.id, T.lat, T.lng).where(
+            T.service_id == service_id,
+            T.lat.between(min_lat, max_lat),
+            or_(*(T.lng.between(lo, hi) for lo, hi in lng_ranges(min_lng, max_lng))),
+        )
+    # only coordinates come back from SQL; full rows are loaded for the hits alone
+    ids, lats, lngs = array("q"), array("d"), array("d")
+    for tech_id, t_lat, t_lng in await db.execute(candidates):
+        ids.append(tech_id)
+        lats.append(t_lat)
+        lngs.append(t_lng)
+    return ids, lats, lngs
+
+async def _execute(db: AsyncSession, plan: str, service_id: int, lat: float, lng: float, radius_km: float):
+    """[(tech_id, distance_km)] within radius_km following plan."""
+    return within_radius(lat, lng, *await _candidates(db, plan, service_id, lat, lng, radius_km), radius_km)
+
+async def radius_hits(db: AsyncSession, service_id: int, lat: float, lng: float, radius_km: float,
+                      columns=None):
+    """([(Technician, distance_km)], plan) for the technicians within radius_km.
+
+    With columns, only those are loaded and Rows stand in for the Technicians.
+    """
+    key = cache_key(service_id, lat, lng, radius_km)
+    plan = await plan_search(db, service_id, lat, lng, radius_km)
+    candidates = search_cache.get(key) if plan == "cache" else None
+    if candidates is None:
+        if plan == "cache":
+            plan = "bbox"  # expired between planning and execution
+        # fetched for the key's circle so any search sharing the key can reuse them
+        candidates = await _candidates(db, plan, *_key_circle(key))
+        if len(candidates[0]) >= settings.search_cache_min_hits:
+            search_cache.set(key, candidates)
+    # exact distances from this search's own centre, cached or not
+    hits = within_radius(lat, lng, *candidates, radius_km)
+    return await _hydrate(db, hits, columns), plan
+
+async def nearest_hits(db: AsyncSession, service_id: int, lat: float, lng: float, k: int):
+    """([(Technician, distance_km)], plan) for the k closest technicians, nearest first."""
+    if settings.geo_backend == "grid":
+        await _ensure_tech_index(db)
+        return await _hydrate(db, tech_index.nearest(service_id, lat, lng, k)), "grid-rings"
+
+    # expanding radius over the SQL index until k hits are inside it, bounded by the
+    # service's size and extent (one indexed aggregate over its (service_id, lat, lng) range)
+    plan = "rtree" if settings.geo_backend == "rtree" else "bbox"
+    T = models.Technician
+    total, min_lat, max_lat, min_lng, max_lng = (await db.execute(
+        select(func.count(), func.min(T.lat), func.max(T.lat), func.min(T.lng), func.max(T.lng))
+        .where(T.service_id == service_id)
+    )).one()
+    if not total:
+        return [], f"{plan}-expanding"
+    k = min(k, total)
+    # start where the extent begins, widened by the radius that would hold k technicians
+    # if the service were spread evenly over its extent
+    gap_km = haversine_km(lat, lng, min(max(lat, min_lat), max_lat), min(max(lng, min_lng), max_lng))
+    area_km2 = ((max_lat - min_lat) * KM_PER_DEG_LAT
+                * (max_lng - min_lng) * KM_PER_DEG_LAT * math.cos(math.radians((min_lat + max_lat) / 2)))
+    radius_km = max(NEAREST_START_KM, gap_km + math.sqrt(k * area_km2 / (math.pi * total)))
+    while True:
+        box_min_lat, box_max_lat, box_min_lng, box_max_lng = bounding_box(lat, lng, radius_km)
+        covers = (box_min_lat <= min_lat and box_max_lat >= max_lat
+                  and (box_min_lng <= min_lng and box_max_lng >= max_lng or box_max_lng - box_min_lng >= 360))
+        if k == total or covers:
+            # every technician is wanted, or the box holds them all: one pass over the service
+            hits = await _execute(db, "service", service_id, lat, lng, MAX_RADIUS_KM)
+            break
+        hits = await _execute(db, plan, service_id, lat, lng, radius_km)
+        if len(hits) >= k:
+            break
+        radius_km *= 2
+    hits.sort(key=lambda hit: hit[1])
+    return await _hydrate(db, hits[:k]), f"{plan}-expanding"
+
+
+@router.get("/search", response_model=list[schemas.TechnicianOut])
+async def search_technicians(
+    response: Response,
+    service_id: int = Query(...),
+    lat: float = Query(...),
+    lng: float = Query(...),
+    radius_km: float = Query(5, gt=0),
+    rank: bool = Query(False, description="Order by rating/jobs/certifications score and distance"),
+    fields: Optional[type] = Depends(fields_param(schemas.TechnicianOut)),
+    db: AsyncSession = Depends(get_db)
+):
+    T = models.Technician
+    columns = None
+    if fields is not None:
+        columns = projection(fields, T)[0]
+        if rank and T.__table__.c.rank_score not in columns:
+            columns = [*columns, T.__table__.c.rank_score]
+    hits, plan = await radius_hits(db, service_id, lat, lng, radius_km, columns)
+    if rank:
+        # static part is precomputed on the row; only the distance term is per query
+        hits.sort(key=lambda hit: ranking.score(hit[0].rank_score, hit[1], radius_km), reverse=True)
+    if fields is not None:
+        return FastJSONResponse(to_dicts(fields, T, [t for t, _ in hits]), headers={PLAN_HEADER: plan})
+    response.headers[PLAN_HEADER] = plan
+    return [t for t, _ in hits]
+
+@router.get("/nearest", response_model=list[schemas.TechnicianNearOut])
+async def nearest_technicians(
+    response: Response,
+    service_id: int = Query(...),
+    lat: float = Query(...),
+    lng: float = Query(...),
+    k: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    hits, plan = await nearest_hits(db, service_id, lat, lng, k + offset)
+    response.headers[PLAN_HEADER] = plan
+    return [
+        schemas.TechnicianNearOut.model_validate(t).model_copy(update={"distance_km": round(d, 3)})
+        for t, d in hits[offset:]
+    ]
@@ -0,0 +1,100 @@
+"""KLL quantile sketch (Karnin, Lang & Liberty, 2016).
+
+Keeps O(k log(n/k)) values in levels of compactors; an item at level h stands
+for 2**h original values. Rank error is roughly 1.7/k with high probability
+(~1% for the default k=200), answers are exact while n <= k, and two sketches
+merge by concatenating their levels and compacting, so per-service, per-area
+and per-day sketches can be combined freely.
+"""
+import math
+import random
+import struct
+from array import array
+
+DEFAULT_K = 200
+_HEADER = struct.Struct("<HQB")  # k, n, number of levels
+_LEVEL = struct.Struct("<I")     # items in the level
+
+class KLLSketch:
+    __slots__ = ("k", "n", "levels")
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.levels = [array("d")]
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self):
+        return sum(len(level) for level in self.levels)
+
+    def _max_size(self):
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self):
+        while self._size() > self._max_size():
+            for h, level in enumerate(self.levels):
+                if len(level) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append(array("d"))
+                    items = sorted(level)
+                    # keep every other item (random phase) at twice the weight
+                    self.levels[h + 1].extend(items[random.getrandbits(1)::2])
+                    self.levels[h] = array("d")
+                    break
+
+    def update(self, value):
+        self.levels[0].append(value)
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(array("d"))
+        for h, level in enumerate(other.levels):
+            self.levels[h].extend(level)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at each fraction in qs (0..1); None when empty."""
+        weighted = sorted((v, 1 << h) for h, level in enumerate(self.levels) for v in level)
+        if not weighted:
+            return [None] * len(qs)
+        total = sum(w for _, w in weighted)
+        out = []
+        for q in qs:
+            target, seen = q * total, 0
+            for v, w in weighted:
+                seen += w
+                if seen >= target:
+                    break
+            out.append(v)
+        return out
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(self.k, self.n, len(self.levels))]
+        for level in self.levels:
+            parts.append(_LEVEL.pack(len(level)))
+            parts.append(level.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        k, n, depth = _HEADER.unpack_from(data)
+        sketch = cls(k)
+        sketch.n = n
+        sketch.levels = []
+        offset = _HEADER.size
+        for _ in range(depth):
+            (size,) = _LEVEL.unpack_from(data, offset)
+            offset += _LEVEL.size
+            level = array("d")
+            level.frombytes(data[offset:offset + 8 * size])
+            offset += 8 * size
+            sketch.levels.append(level)
+        return sketch
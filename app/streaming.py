@@ -0,0 +1,42 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from .database import engine
+from .fastjson import dumps, projection, to_dicts
+
+NDJSON = "application/x-ndjson"
+STREAM_BATCH = 500
+
+def stream_format(request: Request, stream: bool):
+    """Return "ndjson" when the client accepts NDJSON, "json" for ?stream=1, else None."""
+    if NDJSON in request.headers.get("accept", ""):
+        return "ndjson"
+    return "json" if stream else None
+
+async def _chunks(stmt, schema, model, fmt):
+    # Core rows (no ORM identity map) fetched yield_per at a time over a server-side
+    # cursor, each batch serialized and sent before the next is read
+    first = True
+    if fmt == "json":
+        yield b"["
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=STREAM_BATCH))
+        async for rows in result.partitions():
+            items = to_dicts(schema, model, rows)
+            if fmt == "ndjson":
+                yield b"".join(dumps(item) + b"\n" for item in items)
+            else:
+                yield (b"" if first else b",") + dumps(items)[1:-1]
+            first = False
+    if fmt == "json":
+        yield b"]"
+
+def stream_rows(model, schema, fmt, *where, after=None):
+    """StreamingResponse of every row of model matching where, in primary key order."""
+    table = model.__table__
+    stmt = select(*projection(schema, model)[0]).where(*where)
+    if after is not None:
+        stmt = stmt.where(table.c.id > after)
+    media_type = NDJSON if fmt == "ndjson" else "application/json"
+    return StreamingResponse(_chunks(stmt.order_by(table.c.id), schema, model, fmt), media_type=media_type)
@@ -1,4 +1,15 @@
+import heapq
 import math
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # in requirements.txt; the plain loops below are only a safety net
+    np = None
+
+KM_PER_DEG_LAT = 111.32
 
 def haversine_km(lat1, lng1, lat2, lng2) -> float:
     R = 6371.0
@@ -10,3 +21,91 @@ def haversine_km(lat1, lng1, lat2, lng2) -> float:
     a = math.sin(dlat/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlng/2)**2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
+
+def bounding_box(lat, lng, radius_km):
+    # (min_lat, max_lat, min_lng, max_lng) enclosing the circle; longitudes may run past
+    # +-180, see lng_ranges. The longitude span is the circle's tangent meridians, or all of them around a pole.
+    angle = radius_km / 6371.0
+    dlat = math.degrees(angle)
+    if lat - dlat <= -90 or lat + dlat >= 90:
+        return max(lat - dlat, -90.0), min(lat + dlat, 90.0), lng - 180.0, lng + 180.0
+    dlng = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+def lng_ranges(min_lng, max_lng):
+    """A box's longitude span as [(lo, hi)] inside -180..180, split where it crosses the antimeridian."""
+    if max_lng - min_lng >= 360:
+        return [(-180.0, 180.0)]
+    if min_lng < -180:
+        return [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return [(min_lng, max_lng)]
+
+def haversine_many(lat, lng, lats, lngs):
+    """Distances in km from (lat, lng) to every point of two parallel array('d') buffers.
+
+    One vectorized pass with numpy (a list from the per-point fallback without it).
+    """
+    if np is not None:
+        p1 = math.radians(lat)
+        p2 = np.radians(np.frombuffer(lats, dtype=np.float64))
+        dlng = np.radians(np.frombuffer(lngs, dtype=np.float64) - lng)
+        a = np.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dlng / 2) ** 2
+        return 2 * 6371.0 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return [haversine_km(lat, lng, t_lat, t_lng) for t_lat, t_lng in zip(lats, lngs)]
+
+def within_radius(lat, lng, ids, lats, lngs, radius_km):
+    """[(id, distance_km)] for the points of the parallel arrays inside radius_km."""
+    if not ids:
+        return []
+    dist = haversine_many(lat, lng, lats, lngs)
+    if np is not None:
+        keep = np.flatnonzero(dist <= radius_km)
+        return list(zip(np.frombuffer(ids, dtype=np.int64)[keep].tolist(), dist[keep].tolist()))
+    return [(i, d) for i, d in zip(ids, dist) if d <= radius_km]
+
+def k_smallest(ids, dist, k):
+    """[(id, distance_km)] of the k smallest distances, nearest first."""
+    if np is not None:
+        dist = np.asarray(dist)
+        order = np.argsort(dist, kind="stable")[:k] if len(dist) <= k else np.argpartition(dist, k - 1)[:k]
+        order = order[np.argsort(dist[order], kind="stable")]
+        return list(zip(np.frombuffer(ids, dtype=np.int64)[order].tolist(), dist[order].tolist()))
+    return heapq.nsmallest(k, zip(ids, dist), key=lambda hit: hit[1])
+
+class TTLCache:
+    """Small thread-safe LRU mapping whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,89 @@
+"""Time a list page through the ORM + response_model path and through the fast path
+(app/fastjson.py), and check both produce the same JSON.
+
+    python -m bench.bench_list_json [rows]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models, schemas
+from app.database import Base, create_async_db_engine
+from app.fastjson import orjson
+from app.pagination import Page, paginate
+from fastapi import Response
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+CASES = [
+    (models.User, schemas.UserOut),
+    (models.Technician, schemas.TechnicianOut),
+    (models.ServiceRequest, schemas.RequestOut),
+    (models.Quotation, schemas.QuotationOut),
+]
+
+
+async def seed(db):
+    await db.execute(insert(models.Service), [{"name": "bench", "description": ""}])
+    await db.execute(insert(models.User), [{"name": f"user {i}", "role": "technician"} for i in range(ROWS)])
+    await db.execute(insert(models.Technician), [
+        {"user_id": i + 1, "display_name": f"tech {i}", "bio": "x" * 200, "service_id": 1,
+         "lat": 13 + i * 1e-4, "lng": 100.5, "rating_count": i % 7, "rating_sum": (i % 7) * 4}
+        for i in range(ROWS)
+    ])
+    await db.execute(insert(models.ServiceRequest), [
+        {"customer_id": 1, "service_id": 1, "title": f"req {i}", "description": "d" * 100,
+         "lat": 13.7, "lng": 100.5} for i in range(ROWS)
+    ])
+    await db.execute(insert(models.Quotation), [
+        {"request_id": i + 1, "technician_id": 1, "price": 100 + i / 3} for i in range(ROWS)
+    ])
+    await db.commit()
+
+
+def slow_encode(schema, rows):
+    # what FastAPI does with a response_model: validate every object, then encode
+    adapter = TypeAdapter(list[schema])
+    return json.dumps(jsonable_encoder(adapter.validate_python(rows, from_attributes=True)),
+                      separators=(",", ":")).encode()
+
+
+async def main():
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_async_db_engine(f"sqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    async with Session() as db:
+        await seed(db)
+
+    print(f"{ROWS} rows per page, encoder: {'orjson' if orjson else 'pydantic-core'}")
+    ok = True
+    page = Page(limit=ROWS, after=None)
+    for model, schema in CASES:
+        async with Session() as db:
+            t0 = time.perf_counter()
+            slow = slow_encode(schema, await paginate(db, select(model), page, Response()))
+            t1 = time.perf_counter()
+        async with Session() as db:
+            t2 = time.perf_counter()
+            fast = (await paginate(db, select(model), page, Response(), schema=schema)).body
+            t3 = time.perf_counter()
+        same = json.loads(slow) == json.loads(fast)
+        ok &= same
+        print(f"{model.__tablename__:18s} orm {1000 * (t1 - t0):7.1f} ms   fast {1000 * (t3 - t2):7.1f} ms"
+              f"   {'same output' if same else 'OUTPUT DIFFERS'}")
+    await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
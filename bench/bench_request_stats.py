@@ -0,0 +1,63 @@
+"""Throughput of a few hot GET endpoints with per-request stats (Server-Timing, SQL
+accounting, sampled request log) switched on and off, in-process over ASGI.
+
+    python -m bench.bench_request_stats [requests per round] [rounds]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("APP_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stats.db')}")
+
+import httpx
+from sqlalchemy import insert
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.main import app, lifespan
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+PATHS = ["/technicians/1", "/technicians?limit=50", "/technicians/1/profile",
+         "/technicians/search?service_id=1&lat=13.7&lng=100.5&radius_km=5"]
+
+
+async def seed():
+    async with SessionLocal() as db:
+        await db.execute(insert(models.Service), [{"name": "stats", "description": ""}])
+        await db.execute(insert(models.User), [{"name": f"u{i}", "role": "technician"} for i in range(200)])
+        await db.execute(insert(models.Technician), [
+            {"user_id": i + 1, "display_name": f"t{i}", "service_id": 1, "lat": 13.7 + i * 1e-4, "lng": 100.5}
+            for i in range(200)
+        ])
+        await db.commit()
+
+
+async def run(c):
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        (await c.get(PATHS[i % len(PATHS)])).raise_for_status()
+    return REQUESTS / (time.perf_counter() - started)
+
+
+async def main():
+    logging.getLogger("app.requests").disabled = True  # measure the sampling decision, not stderr
+    async with lifespan(app):
+        await seed()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stats") as c:
+            await run(c)  # warm up caches and the connection pool
+            best = {True: 0.0, False: 0.0}
+            for _ in range(ROUNDS):
+                for enabled in (False, True):
+                    settings.request_stats = enabled
+                    best[enabled] = max(best[enabled], await run(c))
+    overhead = 100 * (best[False] - best[True]) / best[False]
+    print(f"off {best[False]:8.1f} req/s   on {best[True]:8.1f} req/s   overhead {overhead:+.2f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Rows scanned vs. rows returned for the /technicians/search radius query.
+
+    python -m bench.bench_search [technicians] [radius_km]
+"""
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base
+from app.utils import bounding_box, haversine_km
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+RADIUS_KM = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+CENTER = (13.7563, 100.5018)  # Bangkok
+SERVICES = 5
+
+
+def seed(db):
+    random.seed(42)
+    db.execute(models.Service.__table__.insert(), [
+        {"id": i, "name": f"service-{i}", "description": ""} for i in range(1, SERVICES + 1)
+    ])
+    db.execute(models.User.__table__.insert(), [
+        {"id": i, "name": f"user-{i}", "role": "technician"} for i in range(1, N + 1)
+    ])
+    db.execute(models.Technician.__table__.insert(), [
+        {
+            "id": i, "user_id": i, "display_name": f"tech-{i}", "bio": "x" * 200,
+            "service_id": i % SERVICES + 1,
+            "lat": CENTER[0] + random.gauss(0, 0.3), "lng": CENTER[1] + random.gauss(0, 0.3),
+        }
+        for i in range(1, N + 1)
+    ])
+    db.commit()
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db)
+
+    T = models.Technician
+    lat, lng = CENTER
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, RADIUS_KM)
+
+    def full_scan():
+        techs = db.query(T).filter(T.service_id == 1).all()
+        return len(techs), [t for t in techs if haversine_km(lat, lng, t.lat, t.lng) <= RADIUS_KM]
+
+    def bbox():
+        techs = db.query(T).filter(
+            T.service_id == 1, T.lat.between(min_lat, max_lat), T.lng.between(min_lng, max_lng),
+        ).all()
+        return len(techs), [t for t in techs if haversine_km(lat, lng, t.lat, t.lng) <= RADIUS_KM]
+
+    lat_band = db.query(func.count(T.id)).filter(T.service_id == 1, T.lat.between(min_lat, max_lat)).scalar()
+    (scan_rows, scan_hits), scan_ms = timed(full_scan)
+    (bbox_rows, bbox_hits), bbox_ms = timed(bbox)
+    assert {t.id for t in scan_hits} == {t.id for t in bbox_hits}
+
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM technicians WHERE service_id = 1 "
+        "AND lat BETWEEN :a AND :b AND lng BETWEEN :c AND :d"
+    ), {"a": min_lat, "b": max_lat, "c": min_lng, "d": max_lng}).all()
+
+    print(f"technicians={N} service rows={scan_rows} radius_km={RADIUS_KM}")
+    print(f"plan: {plan[0][-1]}")
+    print(f"{'strategy':<10}{'index entries':>15}{'rows fetched':>14}{'returned':>10}{'ms/query':>10}")
+    print(f"{'full scan':<10}{scan_rows:>15}{scan_rows:>14}{len(scan_hits):>10}{scan_ms:>10.2f}")
+    print(f"{'bbox':<10}{lat_band:>15}{bbox_rows:>14}{len(bbox_hits):>10}{bbox_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
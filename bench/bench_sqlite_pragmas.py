@@ -0,0 +1,83 @@
+"""Concurrent read/write throughput of app.db for each SQLite PRAGMA profile.
+
+Reader threads run the list_quotations query while one writer inserts a
+quotation and commits, mirroring create_quotation.
+
+    python -m bench.bench_sqlite_pragmas [seconds] [readers]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import SQLITE_PRAGMA_PROFILES, Base, create_db_engine
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+READERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+
+def run(profile):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_db_engine(f"sqlite:///{path}", profile)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all(models.Quotation(request_id=i % 50, technician_id=1, price=100.0) for i in range(5000))
+        db.commit()
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + SECONDS
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader(n):
+        with Session() as db:
+            while time.perf_counter() < stop:
+                try:
+                    db.scalars(select(models.Quotation).where(models.Quotation.request_id == n % 50)).all()
+                    db.rollback()
+                    bump("reads")
+                except OperationalError:
+                    db.rollback()
+                    bump("errors")
+
+    def writer():
+        with Session() as db:
+            while time.perf_counter() < stop:
+                try:
+                    db.add(models.Quotation(request_id=7, technician_id=1, price=120.0))
+                    db.commit()
+                    bump("writes")
+                except OperationalError:
+                    db.rollback()
+                    bump("errors")
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return counts
+
+
+def main():
+    print(f"{READERS} readers + 1 writer for {SECONDS:.0f}s")
+    print(f"{'profile':<13}{'reads/s':>10}{'writes/s':>10}{'errors':>8}")
+    for profile in SQLITE_PRAGMA_PROFILES:
+        c = run(profile)
+        print(f"{profile:<13}{c['reads'] / SECONDS:>10.0f}{c['writes'] / SECONDS:>10.0f}{c['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
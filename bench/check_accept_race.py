@@ -0,0 +1,55 @@
+"""Quote a request from every technician at once, then fire concurrent accepts at
+every quotation: all quotations must be created, exactly one accept must win and
+the rest get 409 (never a 500 from a constraint violation).
+
+    python -m bench.check_accept_race [rounds] [quotations]
+"""
+import asyncio
+import collections
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("APP_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'race.db')}")
+
+import httpx
+
+from app.main import app, lifespan
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+QUOTES = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+
+async def main():
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://race") as c:
+            async def post(path, **body):
+                r = await c.post(path, json=body)
+                r.raise_for_status()
+                return r.json()
+
+            svc = await post("/services", name="race", description="")
+            customer = await post("/users", name="customer")
+            techs = []
+            for i in range(QUOTES):
+                user = await post("/users", name=f"tech{i}", role="technician")
+                techs.append(await post("/technicians", user_id=user["id"], display_name=f"tech{i}",
+                                        service_id=svc["id"], lat=13.7, lng=100.5))
+
+            outcomes = collections.Counter()
+            for _ in range(ROUNDS):
+                req = await post("/requests", customer_id=customer["id"], service_id=svc["id"],
+                                 title="race", description="", lat=13.7, lng=100.5)
+                quotes = await asyncio.gather(*(post(f"/requests/{req['id']}/quotations", technician_id=t["id"],
+                                                     price=100) for t in techs))
+                results = await asyncio.gather(*(c.post(f"/quotations/{q['id']}/accept") for q in quotes))
+                outcomes[tuple(sorted(r.status_code for r in results))] += 1
+
+    expected = (200,) + (409,) * (QUOTES - 1)
+    for codes, n in outcomes.items():
+        print(f"{'ok  ' if codes == expected else 'FAIL'} {n:4d} x {codes}")
+    return set(outcomes) == {expected}
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,43 @@
+"""Fixtures shared by the test suite: the app on a throwaway SQLite file and SQL capture."""
+import os
+import tempfile
+
+# before the app is imported: settings are read once, at import time
+os.environ["APP_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ["APP_REQUEST_LOG_SAMPLE_RATE"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def statements():
+    """[(statement, parameters)] run on the app's engine during the test (executemany excluded)."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+@pytest.fixture(scope="session")
+def post(client):
+    def post(path, **body):
+        r = client.post(path, json=body)
+        assert r.status_code == 200, r.text
+        return r.json()
+    return post
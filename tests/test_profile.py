@@ -0,0 +1,43 @@
+"""GET /technicians/{id}/profile loads a profile of any size in a fixed number of statements."""
+import pytest
+from sqlalchemy import insert
+
+from app import models
+from app.database import create_db_engine
+
+BUDGET = 3
+CERTS = 20
+REVIEWS = 50
+
+
+@pytest.fixture(scope="module")
+def tech_id(post):
+    svc = post("/services", name="profile", description="")
+    user = post("/users", name="profiled", role="technician")
+    tech = post("/technicians", user_id=user["id"], display_name="profiled", service_id=svc["id"],
+                lat=13.7, lng=100.5)
+    customer = post("/users", name="reviewer")
+    engine = create_db_engine()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Certification), [
+            {"technician_id": tech["id"], "title": f"cert {i}", "issuer": "board", "year": 2020}
+            for i in range(CERTS)
+        ])
+        # job ids well clear of the jobs other tests create; only the reviews are read here
+        conn.execute(insert(models.Review), [
+            {"job_id": 100_000 + i, "customer_id": customer["id"], "technician_id": tech["id"],
+             "rating": 1 + i % 5} for i in range(REVIEWS)
+        ])
+    engine.dispose()
+    return tech["id"]
+
+
+@pytest.mark.parametrize("reviews", [0, 10, REVIEWS])
+def test_profile_statement_budget(client, tech_id, statements, reviews):
+    r = client.get(f"/technicians/{tech_id}/profile", params={"reviews": reviews})
+    assert r.status_code == 200, r.text
+    profile = r.json()
+    assert len(profile["certifications"]) == CERTS
+    assert len(profile["recent_reviews"]) == reviews
+    assert profile["service_name"] == "profile"
+    assert len(statements) <= BUDGET, "\n".join(statement for statement, _ in statements)
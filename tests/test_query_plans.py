@@ -0,0 +1,70 @@
+"""The statements hot endpoints actually issue must not plan a full table SCAN."""
+import sqlite3
+
+import pytest
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+
+@pytest.fixture(scope="module")
+def ids(post):
+    svc = post("/services", name="plans", description="")
+    customer = post("/users", name="customer")
+    techs = []
+    for i in range(3):
+        user = post("/users", name=f"tech{i}", role="technician")
+        techs.append(post("/technicians", user_id=user["id"], display_name=f"tech{i}",
+                          service_id=svc["id"], lat=13.7 + i * 0.01, lng=100.5))
+    req = post("/requests", customer_id=customer["id"], service_id=svc["id"],
+               title="leak", description="", lat=13.7, lng=100.5)
+    quotes = [post(f"/requests/{req['id']}/quotations", technician_id=t["id"], price=100 + i)
+              for i, t in enumerate(techs)]
+    post(f"/technicians/{techs[0]['id']}/certifications", title="license", issuer="board", year=2020)
+    return {"service": svc["id"], "tech": techs[0]["id"], "request": req["id"],
+            "quotes": [q["id"] for q in quotes], "customer": customer["id"]}
+
+
+def query_plan(statement, parameters):
+    with sqlite3.connect(make_url(settings.database_url).database) as conn:
+        return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())]
+
+
+def assert_no_scan(statements):
+    checked = 0
+    for statement, parameters in statements:
+        if statement.lstrip().split(None, 1)[0].upper() not in ("SELECT", "UPDATE", "DELETE"):
+            continue
+        plan = query_plan(statement, parameters)
+        assert not [step for step in plan if step.startswith("SCAN")], f"{statement}\n{plan}"
+        checked += 1
+    assert checked, "no statement was checked"
+
+
+HOT_READS = {
+    "list_quotations": lambda ids: (f"/requests/{ids['request']}/quotations", {}),
+    "list_reviews": lambda ids: (f"/technicians/{ids['tech']}/reviews", {}),
+    "list_certs": lambda ids: (f"/technicians/{ids['tech']}/certifications", {}),
+    "technician_profile": lambda ids: (f"/technicians/{ids['tech']}/profile", {}),
+    "price_estimate": lambda ids: ("/price-estimate", {"service_id": ids["service"]}),
+    "price_estimate (nearby)": lambda ids: ("/price-estimate", {"service_id": ids["service"], "lat": 13.7, "lng": 100.5}),
+    "price_trend": lambda ids: ("/price-estimate/trend", {"service_id": ids["service"]}),
+    "search_technicians": lambda ids: ("/technicians/search", {"service_id": ids["service"], "lat": 13.7, "lng": 100.5}),
+    "nearest_technicians": lambda ids: ("/technicians/nearest", {"service_id": ids["service"], "lat": 13.7, "lng": 100.5, "k": 2}),
+}
+
+
+@pytest.mark.parametrize("endpoint", HOT_READS)
+def test_hot_reads_use_indexes(client, ids, statements, endpoint):
+    path, params = HOT_READS[endpoint](ids)
+    r = client.get(path, params=params)
+    assert r.status_code == 200, r.text
+    assert_no_scan(statements)
+
+
+def test_job_lifecycle_uses_indexes(client, ids, post, statements):
+    # accept_quotation, complete_job and create_review filter on foreign keys and status
+    job = post(f"/quotations/{ids['quotes'][0]}/accept")
+    post(f"/jobs/{job['id']}/complete")
+    post("/reviews", job_id=job["id"], rating=5)
+    assert_no_scan(statements)